@@ -0,0 +1,110 @@
+import threading
+from collections import deque
+
+
+class GtinRangeExhausted(Exception):
+    """Raised when every item reference under a company prefix has been allocated."""
+
+
+class GtinAllocator:
+    """Hands out unused GTIN-13s under GS1 company prefixes.
+
+    Each process claims blocks of item references from the database with
+    ``claim_block(prefix, count, max_ref)``, which must return the claimed
+    ``(start, end)`` half-open range and be atomic across processes. References in
+    a block that are already used (``find_taken(gtins)``) are dropped once, when
+    the block is claimed, and the rest are kept as a deque of free ranges, so each
+    allocation afterwards is O(1). References left unallocated when a process
+    exits are simply skipped.
+
+    Blocks are at most ``block_size`` and at most a quarter of the range's share
+    for each of ``processes``, so short prefixes' small ranges are not taken by
+    one process (or lost with it at exit). Once the references left in the range
+    would not give every process a full block, only the references needed are
+    claimed.
+    """
+
+    def __init__(self, claim_block, find_taken, complete_gtin, block_size=100, processes=1):
+        self._claim_block = claim_block
+        self._find_taken = find_taken
+        self._complete_gtin = complete_gtin
+        self.block_size = block_size
+        self.processes = processes
+        self._free = {}  # company prefix -> deque of [start, end) item reference ranges
+        self._unclaimed = {}  # company prefix -> references left in the range after the last claim
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.blocks_claimed = 0
+
+    @staticmethod
+    def validate_prefix(prefix):
+        prefix = str(prefix or "")
+        if not prefix.isdigit() or not 6 <= len(prefix) <= 11:
+            raise ValueError("Company prefix must be 6 to 11 digits long")
+        return prefix
+
+    def _gtin(self, prefix, ref):
+        return self._complete_gtin(prefix + str(ref).zfill(12 - len(prefix)))
+
+    def _claim_size(self, prefix, max_ref, wanted):
+        block = min(self.block_size, max(1, (max_ref + 1) // (self.processes * 4)))
+        unclaimed = self._unclaimed.get(prefix)
+        if unclaimed is not None and unclaimed < block * self.processes:
+            block = 1
+        return max(wanted, block)
+
+    def _refill(self, prefix, free, wanted):
+        max_ref = 10 ** (12 - len(prefix)) - 1
+        claimed = self._claim_block(prefix, self._claim_size(prefix, max_ref, wanted), max_ref)
+        if claimed is None:
+            raise GtinRangeExhausted(f"No GTINs left for company prefix {prefix}")
+        start, end = claimed
+        self.blocks_claimed += 1
+        self._unclaimed[prefix] = max_ref + 1 - end
+
+        taken = self._find_taken([self._gtin(prefix, ref) for ref in range(start, end)])
+        taken_refs = sorted(int(gtin[len(prefix):12]) for gtin in taken)
+        for ref in taken_refs:
+            if start < ref:
+                free.append([start, ref])
+            start = ref + 1
+        if start < end:
+            free.append([start, end])
+
+    def allocate(self, prefix, count=1):
+        """Returns count unused GTIN-13s under the company prefix."""
+        prefix = self.validate_prefix(prefix)
+        handed_out = []  # [start, end) ranges taken by this call
+        remaining = count
+        with self._lock:
+            free = self._free.setdefault(prefix, deque())
+            try:
+                while remaining:
+                    if not free:
+                        self._refill(prefix, free, remaining)
+                        continue
+                    span = free[0]
+                    take = min(remaining, span[1] - span[0])
+                    handed_out.append((span[0], span[0] + take))
+                    span[0] += take
+                    remaining -= take
+                    if span[0] == span[1]:
+                        free.popleft()
+            except Exception:
+                # Give back what this call took so a failed request does not burn references
+                for start, end in reversed(handed_out):
+                    free.appendleft([start, end])
+                raise
+            self.allocated += count
+        return [self._gtin(prefix, ref) for start, end in handed_out for ref in range(start, end)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "allocated": self.allocated,
+                "blocks_claimed": self.blocks_claimed,
+                "free": {
+                    prefix: sum(end - start for start, end in free)
+                    for prefix, free in self._free.items()
+                },
+            }
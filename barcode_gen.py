@@ -1,18 +1,47 @@
 import os
+import cProfile
+import csv
+import io
+import json
+import random
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
 import psycopg2
-from psycopg2 import pool
-import barcode
-from barcode.writer import ImageWriter
-from flask import Flask, request, jsonify
-from supabase import create_client
+from psycopg2.extras import execute_values
+from flask import Flask, Response, g, request, jsonify
 from dotenv import load_dotenv
-import qrcode
+
+from allocator import GtinAllocator, GtinRangeExhausted
+from cache import ImageCache, LookupCache, create_cache_backend
+from db import ConnectionPool
+import ean13
+import labels
+from metrics import Metrics, current_endpoint
+from process_local import ProcessLocal
+from singleflight import SingleFlight
+from storage import LocalStorage, SupabaseStorage
+from upload_queue import UploadQueue, UploadQueueFull
 
 load_dotenv()  # Load environment variables from .env file
 
 app = Flask(__name__)
 
+# Per-stage latency histograms and error counters, served on /metrics. Set METRICS_DIR
+# to a directory shared by the gunicorn workers to aggregate across all of them.
+metrics = Metrics(os.getenv("METRICS_DIR"), float(os.getenv("METRICS_FLUSH_INTERVAL", "5")))
+metrics.describe("barcode_request_duration_seconds", "histogram", "Request latency by endpoint")
+metrics.describe("barcode_stage_duration_seconds", "histogram", "Latency of each stage of an endpoint")
+metrics.describe("barcode_http_requests_total", "counter", "Responses by endpoint and status code")
+metrics.describe("barcode_stage_errors_total", "counter", "Failures by endpoint and stage")
+
+# Optional cProfile sampling: a fraction PROFILE_SAMPLE_RATE of requests is profiled
+# and the profile is kept in PROFILE_DIR when the request took over PROFILE_SLOW_MS
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/barcode_profiles")
+
 # Supabase Database Connection Pool
 DB_CONFIG = {
     "dbname": os.getenv("DB_NAME"),
@@ -23,22 +52,158 @@ DB_CONFIG = {
     "sslmode": "require"  # Enforce SSL connection
 }
 
-db_pool = pool.SimpleConnectionPool(1, 10, **DB_CONFIG)
+def connect_db():
+    """Opens a database connection in autocommit mode.
+
+    Every query the app sends is a single statement, so writes stay atomic, and
+    lookups no longer leave a transaction open that costs a ROLLBACK on release.
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    return conn
+
+# Thread-safe pool; every query checks out a connection with get_db_connection().
+# Each process opens its own pool on first use, so no socket is shared across a fork.
+db_pool = ProcessLocal(lambda: ConnectionPool(
+    connect_db,
+    minconn=int(os.getenv("DB_POOL_MIN", "1")),
+    maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    health_check_interval=float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "30"))
+))
 
 # Supabase Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET")
 QR_SUPABASE_BUCKET = os.getenv("QR_CODE_BUCKET")
-QR_SUPABASE_BUCKET = os.getenv("QR_CODE_BUCKET")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Object storage: Supabase by default, or a local directory stand-in for testing
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+if STORAGE_BACKEND == "local":
+    storage = LocalStorage(
+        os.getenv("LOCAL_STORAGE_DIR", "local_storage"),
+        os.getenv("LOCAL_STORAGE_URL", "http://localhost:5001")
+    )
+else:
+    storage = SupabaseStorage(SUPABASE_URL, SUPABASE_KEY)
+
+# Bulk generation settings. A request is handled synchronously, so it has to finish
+# well inside the gunicorn worker timeout (GUNICORN_TIMEOUT in gunicorn.conf.py): a
+# worker killed mid-request leaves its reserved rows pointing at images never uploaded.
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "8"))
+SCAN_BATCH_MAX_ITEMS = int(os.getenv("SCAN_BATCH_MAX_ITEMS", "1000"))
+GTIN_ALLOCATION_BLOCK = int(os.getenv("GTIN_ALLOCATION_BLOCK", "100"))
+GTIN_ALLOCATION_MAX = int(os.getenv("GTIN_ALLOCATION_MAX", "1000"))
+GTIN_ALLOCATION_RETRIES = int(os.getenv("GTIN_ALLOCATION_RETRIES", "5"))
+# Processes claiming references under the same prefixes, used to size their blocks
+GTIN_ALLOCATION_PROCESSES = int(os.getenv("GTIN_ALLOCATION_PROCESSES", os.getenv("GUNICORN_WORKERS", "4")))
+LABEL_MAX_ITEMS = int(os.getenv("LABEL_MAX_ITEMS", "20000"))
+LABEL_WORKERS = int(os.getenv("LABEL_WORKERS", str(os.cpu_count() or 1)))
+
+# Shared pool for rendering and uploading barcodes in bulk requests, and the process
+# pool that renders label sheet tiles; both are created per process on first use
+render_executor = ProcessLocal(lambda: ThreadPoolExecutor(max_workers=BULK_WORKERS))
+label_executor = ProcessLocal(lambda: labels.create_executor(LABEL_WORKERS))
+
+# Rendered images are kept in memory, keyed on (symbology, payload, writer options)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+image_cache = ImageCache(IMAGE_CACHE_MAX_BYTES)
+
+# Barcodes are drawn by the native EAN-13 rasterizer (ean13.py) unless a request
+# asks for python-barcode's writers with "renderer": "imagewriter"
+BARCODE_RENDERER = os.getenv("BARCODE_RENDERER", "native")
+BARCODE_RENDERERS = ("native", "imagewriter")
+IMAGE_CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+BARCODE_WRITER_OPTIONS = {}
+QR_OPTIONS = {"version": 1, "error_correction": "L", "box_size": 10, "border": 4}
+
+# Read-through caches in front of /scan_barcode and /get_qr. The "memory" backend is
+# per process; set LOOKUP_CACHE_BACKEND=redis and REDIS_URL to share it across workers.
+# Rows are stored before their image is uploaded and deleted if the upload fails; those
+# deletes (and the pending marks that keep such rows out of the cache meanwhile) only
+# reach other workers through redis. With the memory backend and several workers, a
+# row deleted after a failed upload can be served by another worker for LOOKUP_CACHE_TTL.
+lookup_cache_backend = create_cache_backend(
+    os.getenv("LOOKUP_CACHE_BACKEND", "memory"),
+    int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", "100000")),
+    os.getenv("REDIS_URL")
+)
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "300"))
+LOOKUP_CACHE_NEGATIVE_TTL = float(os.getenv("LOOKUP_CACHE_NEGATIVE_TTL", "5"))
+# Longest time a row can wait for its image upload, queued uploads and retries included
+LOOKUP_CACHE_PENDING_TTL = float(os.getenv("LOOKUP_CACHE_PENDING_TTL", "600"))
+product_cache = LookupCache(
+    "product", lookup_cache_backend, LOOKUP_CACHE_TTL, LOOKUP_CACHE_NEGATIVE_TTL, LOOKUP_CACHE_PENDING_TTL
+)
+qr_cache = LookupCache(
+    "qr", lookup_cache_backend, LOOKUP_CACHE_TTL, LOOKUP_CACHE_NEGATIVE_TTL, LOOKUP_CACHE_PENDING_TTL
+)
+
+# Background image uploads. With UPLOAD_MODE=async (or "async": true in the request body)
+# the row is stored with its public URL and the endpoint returns 202 with a job id.
+# Job status is shared through the lookup cache backend, so this needs
+# LOOKUP_CACHE_BACKEND=redis (and the redis package) when several processes serve
+# requests; with the memory backend uploads stay synchronous unless single_process is set.
+UPLOAD_MODE = os.getenv("UPLOAD_MODE", "sync")
+UPLOAD_ENQUEUE_TIMEOUT = float(os.getenv("UPLOAD_ENQUEUE_TIMEOUT", "1"))
+upload_queue = UploadQueue(
+    storage,
+    create_cache_backend(
+        os.getenv("LOOKUP_CACHE_BACKEND", "memory"),
+        int(os.getenv("UPLOAD_JOB_MAX_ENTRIES", "100000")),
+        os.getenv("REDIS_URL")
+    ),
+    workers=int(os.getenv("UPLOAD_WORKERS", "4")),
+    max_depth=int(os.getenv("UPLOAD_QUEUE_MAX_DEPTH", "1000")),
+    max_attempts=int(os.getenv("UPLOAD_MAX_ATTEMPTS", "5")),
+    backoff_base=float(os.getenv("UPLOAD_BACKOFF_BASE", "0.5"))
+)
+
+UPLOAD_DRAIN_TIMEOUT = float(os.getenv("UPLOAD_DRAIN_TIMEOUT", "20"))
+# Set when every request is served by this one process (the development server, or a
+# single gunicorn worker), so job status in the memory backend is visible to all of them
+single_process = False
+
+# Concurrent identical create requests share one render and upload
+create_flights = SingleFlight()
 
 def get_db_connection():
-    return db_pool.getconn()
+    """Context manager yielding a pooled connection that is always released."""
+    return db_pool.get().connection()
+
+@metrics.timed("allocate")
+def claim_gtin_block(company_prefix, count, max_ref):
+    """Atomically claims up to count item references for a company prefix.
 
-def release_db_connection(conn):
-    db_pool.putconn(conn)
+    Returns the claimed [start, end) range, or None once the prefix is exhausted.
+    """
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO gtin_ranges (company_prefix, next_ref, max_ref) VALUES (%s, 0, %s) "
+            "ON CONFLICT (company_prefix) DO NOTHING; "
+            "UPDATE gtin_ranges r SET next_ref = LEAST(r.next_ref + %s, r.max_ref + 1) "
+            "FROM (SELECT company_prefix, next_ref FROM gtin_ranges "
+            "WHERE company_prefix = %s FOR UPDATE) old "
+            "WHERE r.company_prefix = old.company_prefix AND r.next_ref <= r.max_ref "
+            "RETURNING old.next_ref, r.next_ref",
+            (company_prefix, max_ref, count, company_prefix)
+        )
+        claimed = cur.fetchone()
+        conn.commit()
+        cur.close()
+    return tuple(claimed) if claimed else None
+
+gtin_allocator = GtinAllocator(
+    claim_gtin_block,
+    lambda gtins: fetch_existing_gtins(gtins),
+    lambda gtin12: calculate_gtin13(gtin12),
+    block_size=GTIN_ALLOCATION_BLOCK,
+    processes=GTIN_ALLOCATION_PROCESSES
+)
 
 def calculate_gtin13(gtin12):
     """Calculates the GTIN-13 check digit."""
@@ -50,141 +215,258 @@ def calculate_gtin13(gtin12):
     check_digit = (10 - ((odd_sum + even_sum) % 10)) % 10
     return gtin12 + str(check_digit)
 
-def generate_gs1_barcode(gtin):
-    """Generates GS1 barcode and saves it to the /tmp directory."""
-    try:
-        barcode_path = f"/tmp/{gtin}"
-        ean = barcode.get_barcode_class('ean13')
-        barcode_instance = ean(gtin, writer=ImageWriter())
+def render_gs1_barcode(gtin, renderer="native", image_format="png"):
+    """Renders a GS1 barcode to PNG or SVG bytes in memory."""
+    if renderer == "native":
+        return ean13.render_svg(gtin) if image_format == "svg" else ean13.render_png(gtin)
+
+    # python-barcode is only needed for this path, so it is imported on first use
+    import barcode
+    from barcode.writer import ImageWriter, SVGWriter
 
-        full_path = barcode_instance.save(barcode_path)
+    buffer = io.BytesIO()
+    ean = barcode.get_barcode_class('ean13')
+    writer = SVGWriter() if image_format == "svg" else ImageWriter()
+    barcode_instance = ean(gtin, writer=writer)
+    barcode_instance.write(buffer, options=BARCODE_WRITER_OPTIONS)
+    return buffer.getvalue()
 
-        if not os.path.exists(full_path):
-            raise FileNotFoundError(f"Barcode image not created at {full_path}")
+def normalize_gtin(gtin):
+    """Normalizes a scanned GTIN to 13 digits, adding or verifying the check digit."""
+    gtin = str(gtin).strip()
+    if len(gtin) == 12:
+        return calculate_gtin13(gtin)
+    if len(gtin) != 13 or not gtin.isdigit():
+        raise ValueError("GTIN must be 12 or 13 digits long")
+    if calculate_gtin13(gtin[:12]) != gtin:
+        raise ValueError("Invalid GTIN check digit")
+    return gtin
 
-        return full_path
+@metrics.timed("render")
+def generate_gs1_barcode(gtin, renderer=None, image_format="png"):
+    """Generates GS1 barcode image bytes, reusing a cached render when available."""
+    renderer = renderer or BARCODE_RENDERER
+    try:
+        options = (renderer, image_format) + tuple(sorted(BARCODE_WRITER_OPTIONS.items()))
+        key = ("ean13", gtin, options)
+        return image_cache.get_or_render(key, lambda: render_gs1_barcode(gtin, renderer, image_format))
     except Exception as e:
         print(f"Error generating barcode: {e}")
+        metrics.error("render")
         return None
 
-def upload_to_supabase(image_path, gtin):
-    """Uploads barcode image to Supabase Storage and returns the public URL."""
-    try:
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"File not found: {image_path}")
-
-        with open(image_path, "rb") as f:
-            response = supabase.storage.from_(SUPABASE_BUCKET).upload(
-                f"static/{gtin}.png", f, {"content-type": "image/png"}
-            )
+def barcode_object_path(gtin, image_format="png"):
+    return f"static/{gtin}.{image_format}"
 
-        public_url = f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_BUCKET}/static/{gtin}.png"
-        return public_url
+@metrics.timed("upload")
+def upload_to_supabase(image_data, gtin, image_format="png"):
+    """Uploads barcode image bytes to Supabase Storage and returns the public URL."""
+    try:
+        path = barcode_object_path(gtin, image_format)
+        # The reserved row makes this the only writer, and overwriting lets a retry
+        # succeed after an upload that stored the object but still raised
+        storage.upload(SUPABASE_BUCKET, path, image_data, IMAGE_CONTENT_TYPES[image_format], upsert=True)
+        return storage.public_url(SUPABASE_BUCKET, path)
     except Exception as e:
         print(f"Error uploading to Supabase: {e}")
+        metrics.error("upload")
         return None
 
-def store_product_in_db(name, price, gtin, barcode_url):
-    """Stores product details in the database."""
-    try:
-        conn = get_db_connection()
+@metrics.timed("insert")
+def reserve_product_in_db(name, price, gtin, barcode_url):
+    """Inserts a product unless its GTIN exists, in one round trip.
+
+    Returns True if the row was inserted and False if the GTIN was already taken.
+    The GTIN stays marked pending in the cache until its image is uploaded.
+    """
+    product_cache.mark_pending([gtin])
+    with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO products (name, price, gtin, barcode_image_path) VALUES (%s, %s, %s, %s)",
+            "INSERT INTO products (name, price, gtin, barcode_image_path) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (gtin) DO NOTHING RETURNING gtin",
             (name, price, gtin, barcode_url)
         )
+        inserted = cur.fetchone() is not None
         conn.commit()
         cur.close()
-        release_db_connection(conn)
-    except Exception as e:
-        print(f"Database Error: {e}")
-        return False
-    return True
+    product_cache.invalidate(gtin)
+    return inserted
 
-def check_if_barcode_exists(gtin):
-    """Checks if a barcode (GTIN) already exists in the database."""
+@metrics.timed("delete")
+def delete_product_from_db(gtin):
+    """Deletes a reserved product whose image could not be generated or uploaded."""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM products WHERE gtin = %s", (gtin,))
-        exists = cur.fetchone()
-        cur.close()
-        release_db_connection(conn)
-        return exists is not None
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM products WHERE gtin = %s", (gtin,))
+            conn.commit()
+            cur.close()
     except Exception as e:
         print(f"Database Error: {e}")
+        metrics.error("delete")
         return False
+    product_cache.invalidate(gtin)
+    return True
 
-def check_if_qr_exists(name):
-    """Checks if a QR code already exists for a given product name."""
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM qr_codes WHERE name = %s LIMIT 1", (name,))
-        exists = cur.fetchone()
-        cur.close()
-        release_db_connection(conn)
-        return exists is not None
-    except Exception as e:
-        print(f"Database Error: {e}")
-        return False
+def render_qr_code(qr_data):
+    """Renders a QR code to PNG bytes in memory."""
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=QR_OPTIONS["version"],
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=QR_OPTIONS["box_size"],
+        border=QR_OPTIONS["border"],
+    )
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    img = qr.make_image(fill="black", back_color="white")
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
 
+@metrics.timed("render")
 def generate_qr_code(name, price):
-    """Generates a QR code and saves it to the /tmp directory."""
+    """Generates QR code PNG bytes, reusing a cached render when available."""
     try:
         qr_data = f"Product: {name}, Price: {price}"
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-
-        qr_path = f"/tmp/{name}_qr.png"
-        img = qr.make_image(fill="black", back_color="white")
-        img.save(qr_path)
-
-        return qr_path
+        key = ("qr", qr_data, tuple(sorted(QR_OPTIONS.items())))
+        return image_cache.get_or_render(key, lambda: render_qr_code(qr_data))
     except Exception as e:
         print(f"Error generating QR Code: {e}")
+        metrics.error("render")
         return None
 
-def upload_qr_to_supabase(image_path, name):
-    """Uploads QR code image to the 'qr_codes' bucket and returns the public URL."""
-    try:
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"File not found: {image_path}")
-
-        with open(image_path, "rb") as f:
-            response = supabase.storage.from_(QR_SUPABASE_BUCKET).upload(
-                f"static/{name}_qr.png", f, {"content-type": "image/png"}
-            )
+def qr_object_path(name):
+    return f"static/{name}_qr.png"
 
-        public_url = f"{SUPABASE_URL}/storage/v1/object/public/{QR_SUPABASE_BUCKET}/static/{name}_qr.png"
-        return public_url
+@metrics.timed("upload")
+def upload_qr_to_supabase(image_data, name):
+    """Uploads QR code image bytes to the 'qr_codes' bucket and returns the public URL."""
+    try:
+        storage.upload(QR_SUPABASE_BUCKET, qr_object_path(name), image_data, "image/png", upsert=True)
+        return storage.public_url(QR_SUPABASE_BUCKET, qr_object_path(name))
     except Exception as e:
         print(f"Error uploading QR code to Supabase: {e}")
+        metrics.error("upload")
         return None
 
-def store_qr_in_db(name, price, qr_url):
-    """Stores QR code details in the qr_codes table."""
-    try:
-        conn = get_db_connection()
+@metrics.timed("insert")
+def reserve_qr_in_db(name, price, qr_url):
+    """Inserts a QR code unless its name exists, in one round trip.
+
+    Returns True if the row was inserted and False if the name was already taken.
+    The name stays marked pending in the cache until its image is uploaded.
+    """
+    qr_cache.mark_pending([name])
+    with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO qr_codes (name, price, qr_code_image_path) VALUES (%s, %s, %s)",
+            "INSERT INTO qr_codes (name, price, qr_code_image_path) VALUES (%s, %s, %s) "
+            "ON CONFLICT (name) DO NOTHING RETURNING name",
             (name, price, qr_url)
         )
+        inserted = cur.fetchone() is not None
         conn.commit()
         cur.close()
-        release_db_connection(conn)
+    qr_cache.invalidate(name)
+    return inserted
+
+@metrics.timed("delete")
+def delete_qr_from_db(name):
+    """Deletes a reserved QR code whose image could not be generated or uploaded."""
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM qr_codes WHERE name = %s", (name,))
+            conn.commit()
+            cur.close()
     except Exception as e:
         print(f"Database Error: {e}")
+        metrics.error("delete")
         return False
+    qr_cache.invalidate(name)
     return True
 
+@metrics.timed("db_lookup")
+def load_qr(name):
+    """Loads (name, price, qr_code_image_path) for a QR code name, or None."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT name, price, qr_code_image_path FROM qr_codes WHERE name = %s", (name,))
+        qr_data = cur.fetchone()
+        cur.close()
+        return qr_data
+
+@metrics.timed("db_lookup")
+def load_products(gtins):
+    """Loads {gtin: (name, price, barcode_image_path)} for many GTINs with a single query."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT gtin, name, price, barcode_image_path FROM products WHERE gtin = ANY(%s)",
+            (list(gtins),)
+        )
+        products = {row[0]: row[1:] for row in cur.fetchall()}
+        cur.close()
+        return products
+
+@metrics.timed("db_lookup")
+def load_product(gtin):
+    """Loads (name, price, barcode_image_path) for a GTIN, or None."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT name, price, barcode_image_path FROM products WHERE gtin = %s", (gtin,))
+        product = cur.fetchone()
+        cur.close()
+        return product
+
+def parse_flag(value):
+    """Parses a boolean request flag given as a JSON boolean, 0/1 or "true"/"false"."""
+    if isinstance(value, bool):
+        return value
+    if value in (0, 1):
+        return value == 1
+    if isinstance(value, str) and value.strip().lower() in ("true", "false", "1", "0"):
+        return value.strip().lower() in ("true", "1")
+    raise ValueError(f"Invalid boolean: {value!r}")
+
+def use_async_upload(data):
+    """Tells whether the image upload for this request should be queued.
+
+    Job status must be readable from every worker, so uploads are only queued when
+    the status backend is shared (Redis) or a single process serves all requests;
+    otherwise they stay synchronous. Raises ValueError for an invalid "async" flag.
+    """
+    requested = parse_flag(data.get("async", UPLOAD_MODE == "async"))
+    if not (upload_queue.status_backend.shared or single_process):
+        return False
+    return requested
+
+@metrics.timed("enqueue")
+def queue_image_upload(bucket, path, image_data, content_type="image/png", on_failure=None, on_success=None):
+    """Queues an image upload and returns its job id.
+
+    ``on_failure`` runs if the upload is finally given up, to delete the stored row,
+    and ``on_success`` once the image is stored. If the queue is still full after
+    waiting, the image is uploaded synchronously (so a stored row never points at a
+    missing image) and None is returned.
+    """
+    try:
+        return upload_queue.submit(
+            bucket, path, image_data, content_type,
+            timeout=UPLOAD_ENQUEUE_TIMEOUT,
+            on_failure=on_failure,
+            on_success=on_success
+        )
+    except UploadQueueFull:
+        storage.upload(bucket, path, image_data, content_type, upsert=True)
+        if on_success is not None:
+            on_success()
+        return None
+
 @app.route('/generate_qrcode', methods=['POST'])
 def generate_qrcode():
     """API endpoint to generate a QR code and store product details separately."""
@@ -194,30 +476,82 @@ def generate_qrcode():
 
     if not name or not price:
         return jsonify({"isSuccess": False, "message": "Missing required fields"}), 400
+    try:
+        async_upload = use_async_upload(data)
+    except ValueError as e:
+        return jsonify({"isSuccess": False, "message": f"async: {e}"}), 400
+
+    body, status = create_flights.do(
+        ("qr", name, str(price), async_upload),
+        lambda: create_qr_code(name, price, async_upload)
+    )
+    return jsonify(body), status
+
+def create_qr_code(name, price, async_upload):
+    """Reserves the QR code name, then renders and uploads its image.
 
-    if check_if_qr_exists(name):
-        return jsonify({"isSuccess": False, "message": "QR Code already exists"}), 400
+    The row is inserted before any rendering so that a name already taken costs a
+    single round trip; it is deleted again if the image cannot be produced.
+    Returns the response body and status code.
+    """
+    if async_upload and upload_queue.full():
+        return {"isSuccess": False, "message": "Upload queue is full, retry later"}, 503
+
+    try:
+        qr_url = storage.public_url(QR_SUPABASE_BUCKET, qr_object_path(name))
+    except ValueError as e:
+        return {"isSuccess": False, "message": str(e)}, 400
+    try:
+        reserved = reserve_qr_in_db(name, price, qr_url)
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return {"isSuccess": False, "message": "Database error"}, 500
+    if not reserved:
+        return {"isSuccess": False, "message": "QR Code already exists"}, 400
 
     # Generate QR Code
-    qr_path = generate_qr_code(name, price)
-    if not qr_path:
-        return jsonify({"isSuccess": False, "message": "Failed to generate QR Code"}), 500
+    qr_image = generate_qr_code(name, price)
+    if not qr_image:
+        delete_qr_from_db(name)
+        return {"isSuccess": False, "message": "Failed to generate QR Code"}, 500
 
-    # Upload to Supabase
-    qr_url = upload_qr_to_supabase(qr_path, name)
-    if not qr_url:
-        return jsonify({"isSuccess": False, "message": "Failed to upload QR Code"}), 500
+    if async_upload:
+        try:
+            job_id = queue_image_upload(
+                QR_SUPABASE_BUCKET,
+                qr_object_path(name),
+                qr_image,
+                on_failure=lambda: delete_qr_from_db(name),
+                on_success=lambda: qr_cache.clear_pending([name])
+            )
+        except Exception as e:
+            print(f"Error uploading QR code to Supabase: {e}")
+            delete_qr_from_db(name)
+            return {"isSuccess": False, "message": "Failed to upload QR Code"}, 500
 
-    # Store in Database
-    if not store_qr_in_db(name, price, qr_url):
-        return jsonify({"isSuccess": False, "message": "Database error"}), 500
+        if job_id:
+            return {
+                "isSuccess": True,
+                "message": "QR Code stored, image upload queued",
+                "name": name,
+                "qr_code_image_path": qr_url,
+                "job_id": job_id,
+                "status_url": f"/upload_jobs/{job_id}"
+            }, 202
 
-    return jsonify({
+    # Upload to Supabase
+    elif not upload_qr_to_supabase(qr_image, name):
+        delete_qr_from_db(name)
+        return {"isSuccess": False, "message": "Failed to upload QR Code"}, 500
+    else:
+        qr_cache.clear_pending([name])
+
+    return {
         "isSuccess": True,
         "message": "QR Code generated and stored successfully",
         "name": name,
         "qr_code_image_path": qr_url
-    }), 201
+    }, 201
 
 
 @app.route('/get_qr', methods=['POST'])
@@ -230,12 +564,8 @@ def get_qr():
         return jsonify({"isSuccess": False, "message": "Name is required"}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT name, price, qr_code_image_path FROM qr_codes WHERE name = %s", (name,))
-        qr_data = cur.fetchone()
-        cur.close()
-        release_db_connection(conn)
+        with metrics.stage("lookup"):
+            qr_data = qr_cache.get_or_load(name, load_qr)
 
         if qr_data:
             return jsonify({
@@ -259,38 +589,345 @@ def generate_barcode():
     name = data.get("name")
     price = data.get("price")
     gtin_input = data.get("gtin")
+    renderer = data.get("renderer", BARCODE_RENDERER)
+    image_format = data.get("format", "png")
 
     if not name or not price:
         return jsonify({"isSuccess": False, "message": "Missing required fields"}), 400
 
+    if renderer not in BARCODE_RENDERERS:
+        return jsonify({"isSuccess": False, "message": f"Unknown renderer: {renderer}"}), 400
+    if image_format not in IMAGE_CONTENT_TYPES:
+        return jsonify({"isSuccess": False, "message": f"Unsupported format: {image_format}"}), 400
+    try:
+        async_upload = use_async_upload(data)
+    except ValueError as e:
+        return jsonify({"isSuccess": False, "message": f"async: {e}"}), 400
+
+    allocate_next = None
     if gtin_input:
         try:
-            gtin = calculate_gtin13(gtin_input[:12])
+            with metrics.stage("validate"):
+                gtin = calculate_gtin13(gtin_input[:12])
         except ValueError as e:
             return jsonify({"isSuccess": False, "message": str(e)}), 400
+    elif data.get("company_prefix"):
+        # Let the server pick the next free GTIN under the company prefix
+        try:
+            gtin = gtin_allocator.allocate(data["company_prefix"])[0]
+        except ValueError as e:
+            return jsonify({"isSuccess": False, "message": str(e)}), 400
+        except GtinRangeExhausted as e:
+            return jsonify({"isSuccess": False, "message": str(e)}), 409
+        except Exception as e:
+            print(f"Database Error: {e}")
+            return jsonify({"isSuccess": False, "message": "Database error"}), 500
+        company_prefix = data["company_prefix"]
+        allocate_next = lambda: gtin_allocator.allocate(company_prefix)[0]
     else:
         return jsonify({"isSuccess": False, "message": "GTIN required"}), 400
 
-    if check_if_barcode_exists(gtin):
-        return jsonify({"isSuccess": False, "message": "Barcode already exists"}), 400
+    body, status = create_flights.do(
+        ("barcode", gtin, name, str(price), renderer, image_format, async_upload),
+        lambda: create_barcode(name, price, gtin, renderer, image_format, async_upload, allocate_next)
+    )
+    return jsonify(body), status
 
-    barcode_path = generate_gs1_barcode(gtin)
-    if not barcode_path:
-        return jsonify({"isSuccess": False, "message": "Failed to generate barcode"}), 500
+def create_barcode(name, price, gtin, renderer, image_format, async_upload, allocate_next=None):
+    """Reserves the GTIN, then renders and uploads its barcode.
 
-    barcode_url = upload_to_supabase(barcode_path, gtin)
-    if not barcode_url:
-        return jsonify({"isSuccess": False, "message": "Failed to upload barcode"}), 500
+    The row is inserted before any rendering so that a GTIN already taken costs a
+    single round trip; it is deleted again if the image cannot be produced. For a
+    server-allocated GTIN, ``allocate_next`` supplies another one when a client
+    created that GTIN after its block was claimed.
+    Returns the response body and status code.
+    """
+    if async_upload and upload_queue.full():
+        return {"isSuccess": False, "message": "Upload queue is full, retry later"}, 503
 
-    if not store_product_in_db(name, price, gtin, barcode_url):
-        return jsonify({"isSuccess": False, "message": "Database error"}), 500
+    for attempt in range(GTIN_ALLOCATION_RETRIES if allocate_next else 1):
+        if attempt:
+            try:
+                gtin = allocate_next()
+            except GtinRangeExhausted as e:
+                return {"isSuccess": False, "message": str(e)}, 409
+            except Exception as e:
+                print(f"Database Error: {e}")
+                return {"isSuccess": False, "message": "Database error"}, 500
 
-    return jsonify({
+        barcode_path = barcode_object_path(gtin, image_format)
+        barcode_url = storage.public_url(SUPABASE_BUCKET, barcode_path)
+        try:
+            reserved = reserve_product_in_db(name, price, gtin, barcode_url)
+        except Exception as e:
+            print(f"Database Error: {e}")
+            return {"isSuccess": False, "message": "Database error"}, 500
+        if reserved:
+            break
+    if not reserved:
+        return {"isSuccess": False, "message": "Barcode already exists"}, 400
+
+    barcode_image = generate_gs1_barcode(gtin, renderer, image_format)
+    if not barcode_image:
+        delete_product_from_db(gtin)
+        return {"isSuccess": False, "message": "Failed to generate barcode"}, 500
+
+    if async_upload:
+        try:
+            job_id = queue_image_upload(
+                SUPABASE_BUCKET,
+                barcode_path,
+                barcode_image,
+                IMAGE_CONTENT_TYPES[image_format],
+                on_failure=lambda: delete_product_from_db(gtin),
+                on_success=lambda: product_cache.clear_pending([gtin])
+            )
+        except Exception as e:
+            print(f"Error uploading to Supabase: {e}")
+            delete_product_from_db(gtin)
+            return {"isSuccess": False, "message": "Failed to upload barcode"}, 500
+
+        if job_id:
+            return {
+                "isSuccess": True,
+                "message": "Product stored, barcode upload queued",
+                "gtin": gtin,
+                "barcode_image_path": barcode_url,
+                "job_id": job_id,
+                "status_url": f"/upload_jobs/{job_id}"
+            }, 202
+
+    elif not upload_to_supabase(barcode_image, gtin, image_format):
+        delete_product_from_db(gtin)
+        return {"isSuccess": False, "message": "Failed to upload barcode"}, 500
+    else:
+        product_cache.clear_pending([gtin])
+
+    return {
         "isSuccess": True,
         "message": "Barcode generated and product stored successfully",
         "gtin": gtin,
         "barcode_image_path": barcode_url
-    }), 201
+    }, 201
+
+def parse_bulk_items():
+    """Parses a bulk request body (JSON array, NDJSON or CSV) into a list of items.
+
+    Items that cannot be parsed are returned as strings holding the error message.
+    """
+    mimetype = request.mimetype
+    if mimetype in ("application/x-ndjson", "application/ndjson"):
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(f"Invalid JSON line: {e}")
+        return items
+
+    if mimetype == "text/csv":
+        reader = csv.DictReader(io.StringIO(request.get_data(as_text=True)))
+        return [dict(row) for row in reader]
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("items")
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of items")
+    return data
+
+@metrics.timed("exists_check")
+def fetch_existing_gtins(gtins):
+    """Returns the subset of the given GTINs already stored, using a single query."""
+    if not gtins:
+        return set()
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT gtin FROM products WHERE gtin = ANY(%s)", (list(gtins),))
+        existing = {row[0] for row in cur.fetchall()}
+        cur.close()
+        return existing
+
+@metrics.timed("insert")
+def reserve_products_in_db(rows):
+    """Inserts many (name, price, gtin, barcode_url) rows with one multi-row insert.
+
+    Returns the set of GTINs inserted; rows whose GTIN is already taken are
+    skipped. Returns None on a database error.
+    """
+    try:
+        product_cache.mark_pending([row[2] for row in rows])
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            inserted = execute_values(
+                cur,
+                "INSERT INTO products (name, price, gtin, barcode_image_path) VALUES %s "
+                "ON CONFLICT (gtin) DO NOTHING RETURNING gtin",
+                rows,
+                page_size=len(rows),
+                fetch=True
+            )
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        print(f"Database Error: {e}")
+        metrics.error("insert")
+        return None
+    for row in rows:
+        product_cache.invalidate(row[2])
+    return {row[0] for row in inserted}
+
+@metrics.timed("delete")
+def delete_products_from_db(gtins):
+    """Deletes reserved products whose images could not be generated or uploaded."""
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM products WHERE gtin = ANY(%s)", (list(gtins),))
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        print(f"Database Error: {e}")
+        metrics.error("delete")
+        return False
+    for gtin in gtins:
+        product_cache.invalidate(gtin)
+    return True
+
+def render_and_upload_barcode(gtin):
+    """Generates a barcode image and uploads it, returning the public URL or None."""
+    barcode_image = generate_gs1_barcode(gtin)
+    if not barcode_image:
+        return None
+    return upload_to_supabase(barcode_image, gtin)
+
+def parse_price(price):
+    """Parses a price given as a number or numeric string into a Decimal."""
+    if isinstance(price, bool) or not isinstance(price, (int, float, str)):
+        raise ValueError("Price must be a number")
+    try:
+        value = Decimal(str(price).strip())
+    except InvalidOperation:
+        raise ValueError("Price must be a number")
+    if not value.is_finite() or value < 0:
+        raise ValueError("Price must be a non-negative number")
+    return value
+
+@metrics.timed("validate")
+def validate_bulk_items(items, results):
+    """Validates bulk items and computes their check digits in one pass.
+
+    Failures are recorded in results; returns {gtin: (index, name, price)} for the
+    items that passed.
+    """
+    pending = {}
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            results[i]["message"] = item
+            continue
+        if not isinstance(item, dict):
+            results[i]["message"] = "Invalid item"
+            continue
+
+        name = item.get("name")
+        price = item.get("price")
+        gtin_input = str(item.get("gtin") or "")
+
+        if not name or not price:
+            results[i]["message"] = "Missing required fields"
+            continue
+        # Checked per item so that one bad value cannot fail the chunk's single insert
+        if not isinstance(name, str):
+            results[i]["message"] = "Name must be a string"
+            continue
+        try:
+            price = parse_price(price)
+        except ValueError as e:
+            results[i]["message"] = str(e)
+            continue
+        if not gtin_input:
+            results[i]["message"] = "GTIN required"
+            continue
+        try:
+            gtin = calculate_gtin13(gtin_input[:12])
+        except ValueError as e:
+            results[i]["message"] = str(e)
+            continue
+
+        results[i]["gtin"] = gtin
+        if gtin in pending:
+            results[i]["message"] = "Duplicate GTIN in request"
+            continue
+        pending[gtin] = (i, name, price)
+    return pending
+
+@app.route('/generate_barcodes', methods=['POST'])
+def generate_barcodes():
+    """API endpoint to generate barcodes and store products in bulk.
+
+    Accepts a JSON array (or {"items": [...]}), NDJSON or CSV with name, price and
+    gtin per item, and reports a result per item so one bad row does not fail the batch.
+    """
+    try:
+        items = parse_bulk_items()
+    except ValueError as e:
+        return jsonify({"isSuccess": False, "message": str(e)}), 400
+
+    if not items:
+        return jsonify({"isSuccess": False, "message": "No items provided"}), 400
+    if len(items) > BULK_MAX_ITEMS:
+        return jsonify({
+            "isSuccess": False,
+            "message": f"Too many items, the limit is {BULK_MAX_ITEMS}"
+        }), 413
+
+    results = [{"index": i, "isSuccess": False} for i in range(len(items))]
+    pending = validate_bulk_items(items, results)
+
+    # Reserve each chunk with one multi-row insert, then render and upload only the
+    # GTINs that were reserved; rows whose image cannot be produced are deleted again
+    gtins = list(pending)
+    for start in range(0, len(gtins), BULK_CHUNK_SIZE):
+        chunk = gtins[start:start + BULK_CHUNK_SIZE]
+        rows = []
+        for gtin in chunk:
+            index, name, price = pending[gtin]
+            rows.append((name, price, gtin, storage.public_url(SUPABASE_BUCKET, barcode_object_path(gtin))))
+
+        reserved = reserve_products_in_db(rows)
+        if reserved is None:
+            for gtin in chunk:
+                results[pending[gtin][0]]["message"] = "Database error"
+            continue
+        for gtin in chunk:
+            if gtin not in reserved:
+                results[pending[gtin][0]]["message"] = "Barcode already exists"
+
+        chunk = [gtin for gtin in chunk if gtin in reserved]
+        failed = []
+        for gtin, barcode_url in zip(chunk, render_executor.get().map(metrics.bind(render_and_upload_barcode), chunk)):
+            index = pending[gtin][0]
+            if not barcode_url:
+                failed.append(gtin)
+                results[index]["message"] = "Failed to generate or upload barcode"
+                continue
+            results[index]["isSuccess"] = True
+            results[index]["message"] = "Barcode generated and product stored successfully"
+            results[index]["barcode_image_path"] = barcode_url
+        if failed:
+            delete_products_from_db(failed)
+        product_cache.clear_pending([gtin for gtin in chunk if gtin not in failed])
+
+    created = sum(1 for result in results if result["isSuccess"])
+    return jsonify({
+        "isSuccess": created == len(results),
+        "message": f"{created} of {len(results)} barcodes generated",
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }), 200
 
 @app.route('/scan_barcode', methods=['POST'])
 def scan_barcode():
@@ -302,12 +939,8 @@ def scan_barcode():
         return jsonify({"isSuccess": False, "message": "GTIN is required"}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT name, price, barcode_image_path FROM products WHERE gtin = %s", (gtin,))
-        product = cur.fetchone()
-        cur.close()
-        release_db_connection(conn)
+        with metrics.stage("lookup"):
+            product = product_cache.get_or_load(gtin, load_product)
 
         if not product:
             return jsonify({"isSuccess": False, "message": "Product not found"}), 404
@@ -324,5 +957,291 @@ def scan_barcode():
         print(f"Database Error: {e}")
         return jsonify({"isSuccess": False, "message": "Database error"}), 500
 
+@app.route('/scan_barcodes', methods=['POST'])
+def scan_barcodes():
+    """API endpoint to look up a basket of barcodes in one round trip.
+
+    Results are returned in request order, with a not-found or invalid marker per item.
+    """
+    data = request.get_json(silent=True)
+    gtins = data.get("gtins") if isinstance(data, dict) else data
+
+    if not isinstance(gtins, list) or not gtins:
+        return jsonify({"isSuccess": False, "message": "A list of GTINs is required"}), 400
+    if len(gtins) > SCAN_BATCH_MAX_ITEMS:
+        return jsonify({
+            "isSuccess": False,
+            "message": f"Too many GTINs, the limit is {SCAN_BATCH_MAX_ITEMS}"
+        }), 413
+
+    normalized = []
+    with metrics.stage("validate"):
+        for gtin in gtins:
+            try:
+                normalized.append(normalize_gtin(gtin))
+            except ValueError as e:
+                normalized.append(e)
+
+    try:
+        with metrics.stage("lookup"):
+            products = product_cache.get_many_or_load(
+                [gtin for gtin in normalized if isinstance(gtin, str)],
+                load_products
+            )
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return jsonify({"isSuccess": False, "message": "Database error"}), 500
+
+    results = []
+    for requested, gtin in zip(gtins, normalized):
+        if isinstance(gtin, ValueError):
+            results.append({"gtin": requested, "isSuccess": False, "message": str(gtin)})
+            continue
+        product = products.get(gtin)
+        if not product:
+            results.append({"gtin": gtin, "isSuccess": False, "message": "Product not found"})
+            continue
+        results.append({
+            "gtin": gtin,
+            "isSuccess": True,
+            "name": product[0],
+            "price": product[1],
+            "barcode_image_path": product[2]
+        })
+
+    found = sum(1 for result in results if result["isSuccess"])
+    return jsonify({
+        "isSuccess": True,
+        "message": f"{found} of {len(results)} products found",
+        "found": found,
+        "results": results
+    }), 200
+
+@app.route('/allocate_gtins', methods=['POST'])
+def allocate_gtins():
+    """API endpoint to allocate the next free GTINs under a GS1 company prefix."""
+    data = request.get_json(silent=True) or {}
+    company_prefix = data.get("company_prefix")
+    count = data.get("count", 1)
+
+    if not company_prefix:
+        return jsonify({"isSuccess": False, "message": "Company prefix is required"}), 400
+    if not isinstance(count, int) or not 1 <= count <= GTIN_ALLOCATION_MAX:
+        return jsonify({
+            "isSuccess": False,
+            "message": f"Count must be between 1 and {GTIN_ALLOCATION_MAX}"
+        }), 400
+
+    try:
+        gtins = gtin_allocator.allocate(company_prefix, count)
+    except ValueError as e:
+        return jsonify({"isSuccess": False, "message": str(e)}), 400
+    except GtinRangeExhausted as e:
+        return jsonify({"isSuccess": False, "message": str(e)}), 409
+    except Exception as e:
+        print(f"Database Error: {e}")
+        return jsonify({"isSuccess": False, "message": "Database error"}), 500
+
+    return jsonify({
+        "isSuccess": True,
+        "message": "GTINs allocated successfully",
+        "company_prefix": company_prefix,
+        "gtins": gtins
+    }), 201
+
+@app.route('/label_sheet', methods=['POST'])
+def label_sheet():
+    """API endpoint to tile many barcodes/QR codes into a print-ready PDF or PNG sheet.
+
+    Takes {"items": [{"gtin": ...} or {"qr": ...}], "layout": {...}, "format": "pdf"|"png"}
+    and streams the result page by page; several PNG pages are returned as a ZIP.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    output_format = data.get("format", "pdf")
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"isSuccess": False, "message": "A list of items is required"}), 400
+    if len(items) > LABEL_MAX_ITEMS:
+        return jsonify({
+            "isSuccess": False,
+            "message": f"Too many items, the limit is {LABEL_MAX_ITEMS}"
+        }), 413
+    if output_format not in ("pdf", "png"):
+        return jsonify({"isSuccess": False, "message": f"Unsupported format: {output_format}"}), 400
+
+    try:
+        layout = labels.Layout.from_dict(data.get("layout") or {})
+    except ValueError as e:
+        return jsonify({"isSuccess": False, "message": str(e)}), 400
+
+    tiles = []
+    with metrics.stage("validate"):
+        for i, item in enumerate(items):
+            try:
+                if isinstance(item, dict) and item.get("gtin"):
+                    tiles.append(("gtin", normalize_gtin(item["gtin"])))
+                elif isinstance(item, dict) and item.get("qr"):
+                    tiles.append(("qr", labels.validate_qr_payload(str(item["qr"]))))
+                else:
+                    raise ValueError("Each item needs a gtin or a qr payload")
+            except ValueError as e:
+                return jsonify({"isSuccess": False, "message": f"Item {i}: {e}"}), 400
+
+    pages = labels.render_pages(tiles, layout, label_executor.get())
+    page_count = -(-len(tiles) // layout.labels_per_page)
+    if output_format == "pdf":
+        body, mimetype, filename = labels.stream_pdf(pages, layout), "application/pdf", "labels.pdf"
+    elif page_count == 1:
+        body, mimetype, filename = labels.stream_png(pages, layout, page_count), "image/png", "labels.png"
+    else:
+        body, mimetype, filename = labels.stream_png(pages, layout, page_count), "application/zip", "labels.zip"
+
+    return Response(body, mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename={filename}",
+        "X-Label-Pages": str(page_count)
+    })
+
+@app.before_request
+def start_request_metrics():
+    current_endpoint.set(request.endpoint or "unknown")
+    metrics.start_flusher()
+    g.request_started = time.perf_counter()
+    g.profiler = None
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            g.profiler = profiler
+        except ValueError:
+            pass  # another request on this thread is already being profiled
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get("request_started", time.perf_counter())
+    endpoint = request.endpoint or "unknown"
+    metrics.observe("barcode_request_duration_seconds", elapsed, endpoint=endpoint)
+    metrics.inc("barcode_http_requests_total", endpoint=endpoint, status=response.status_code)
+
+    profiler = g.get("profiler")
+    if profiler is not None:
+        profiler.disable()
+        if elapsed * 1000 >= PROFILE_SLOW_MS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(
+                PROFILE_DIR, f"{endpoint}-{int(time.time() * 1000)}-{os.getpid()}.prof"
+            ))
+            metrics.inc("barcode_profiles_written_total", endpoint=endpoint)
+    return response
+
+def collect_runtime_metrics():
+    """Samples pool, cache and queue state for /metrics."""
+    pool = db_pool.peek()
+    if pool is not None:
+        pool_stats = pool.stats()
+        yield "gauge", "barcode_db_pool_connections", {"state": "in_use"}, pool_stats["in_use"]
+        yield "gauge", "barcode_db_pool_connections", {"state": "idle"}, pool_stats["idle"]
+        yield "gauge", "barcode_db_pool_waiters", {}, pool_stats["waiters"]
+        yield "counter", "barcode_db_pool_checkouts_total", {}, pool_stats["checkouts"]
+        yield "counter", "barcode_db_pool_timeouts_total", {}, pool_stats["timeouts"]
+        yield "counter", "barcode_db_pool_discarded_total", {}, pool_stats["discarded"]
+        yield "counter", "barcode_db_pool_checkout_wait_seconds_total", {}, pool.wait_seconds
+
+    for name, cache in (("product", product_cache), ("qr", qr_cache)):
+        cache_stats = cache.stats()
+        for result in ("hits", "negative_hits", "misses"):
+            yield "counter", "barcode_lookup_cache_requests_total", {"cache": name, "result": result}, cache_stats[result]
+
+    image_stats = image_cache.stats()
+    yield "counter", "barcode_image_cache_requests_total", {"result": "hits"}, image_stats["hits"]
+    yield "counter", "barcode_image_cache_requests_total", {"result": "misses"}, image_stats["misses"]
+    yield "gauge", "barcode_image_cache_bytes", {}, image_stats["bytes"]
+    yield "gauge", "barcode_upload_queue_depth", {}, upload_queue.depth()
+
+metrics.add_collector(collect_runtime_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Exposes metrics from every worker in Prometheus text format."""
+    return Response(metrics.export(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/upload_jobs/<job_id>', methods=['GET'])
+def upload_job_status(job_id):
+    """Reports the status of a queued image upload."""
+    job = upload_queue.status(job_id)
+    if not job:
+        return jsonify({"isSuccess": False, "message": "Upload job not found"}), 404
+
+    return jsonify({"isSuccess": True, "job_id": job_id, **job}), 200
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Reports in-process cache, upload queue and connection pool counters."""
+    pool = db_pool.peek()
+    return jsonify({
+        "isSuccess": True,
+        "image_cache": image_cache.stats(),
+        "product_cache": product_cache.stats(),
+        "qr_cache": qr_cache.stats(),
+        "upload_queue": {"depth": upload_queue.depth()},
+        "db_pool": pool.stats() if pool is not None else None,
+        "create_requests_shared": create_flights.shared,
+        "gtin_allocator": gtin_allocator.stats()
+    }), 200
+
+def warm_up():
+    """Imports the renderers and draws one barcode and QR code, without opening any connection.
+
+    Run in the gunicorn master with preload_app, so workers inherit loaded modules,
+    fonts and layouts instead of paying for them on their first request.
+    """
+    import barcode.writer  # noqa: F401
+    import qrcode  # noqa: F401
+    if STORAGE_BACKEND != "local":
+        import supabase  # noqa: F401
+
+    render_gs1_barcode("4006381333931", BARCODE_RENDERER)
+    render_gs1_barcode("4006381333931", BARCODE_RENDERER, "svg")
+    render_qr_code("warm-up")
+
+def init_worker(only_worker=False):
+    """Opens this process's database pool and storage client before it serves requests.
+
+    Called from gunicorn's post_worker_init hook, with only_worker set when gunicorn
+    runs a single worker. Failures are only logged: the pool and client are retried on
+    first use.
+    """
+    global single_process
+    single_process = only_worker
+    warn_if_async_unavailable()
+    metrics.start_flusher()
+    try:
+        db_pool.get()
+    except Exception as e:
+        print(f"Database Connection Error: {e}")
+    try:
+        storage.connect()
+    except Exception as e:
+        print(f"Storage Client Error: {e}")
+
+def shutdown_worker():
+    """Finishes queued uploads before the worker exits (gunicorn worker_exit hook)."""
+    abandoned = upload_queue.drain(UPLOAD_DRAIN_TIMEOUT)
+    if abandoned:
+        print(f"Upload Queue Error: {abandoned} queued uploads abandoned at shutdown")
+
+def create_app():
+    """App factory for gunicorn ("barcode_gen:create_app()"); see gunicorn.conf.py."""
+    warm_up()
+    return app
+
+def warn_if_async_unavailable():
+    """Reports UPLOAD_MODE=async being ignored because job status cannot be shared."""
+    if UPLOAD_MODE == "async" and not (upload_queue.status_backend.shared or single_process):
+        print("UPLOAD_MODE=async needs LOOKUP_CACHE_BACKEND=redis to share job status; uploads stay synchronous")
+
 if __name__ == '__main__':
+    # The development server runs every request in this process
+    single_process = True
+    warn_if_async_unavailable()
     app.run(port=5001, threaded=True)
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""Compares the native EAN-13 rasterizer with python-barcode's ImageWriter.
+
+Usage: python benchmarks/bench_ean13.py [--count N]
+
+Renders the same GTINs with each renderer and prints the mean time per render
+and the speedup over ImageWriter as JSON.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import barcode
+from barcode.writer import ImageWriter
+
+import ean13
+
+
+def render_imagewriter(gtin):
+    buffer = io.BytesIO()
+    barcode.get_barcode_class('ean13')(gtin, writer=ImageWriter()).write(buffer)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    "imagewriter_png": render_imagewriter,
+    "native_png": ean13.render_png,
+    "native_svg": ean13.render_svg,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=500, help="GTINs rendered per renderer")
+    args = parser.parse_args()
+
+    ean = barcode.get_barcode_class('ean13')
+    gtins = [ean(f"{400000000000 + i * 7919:012d}").get_fullcode() for i in range(args.count)]
+
+    # Warm up font loading and layout caches so only steady-state cost is measured
+    for render in RENDERERS.values():
+        render(gtins[0])
+
+    results = {}
+    for name, render in RENDERERS.items():
+        started = time.perf_counter()
+        size = sum(len(render(gtin)) for gtin in gtins)
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "renders": len(gtins),
+            "ms_per_render": 1000 * elapsed / len(gtins),
+            "renders_per_second": len(gtins) / elapsed,
+            "mean_bytes": size / len(gtins),
+        }
+
+    baseline = results["imagewriter_png"]["ms_per_render"]
+    for result in results.values():
+        result["speedup"] = baseline / result["ms_per_render"]
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""Load benchmark for /generate_barcode, /generate_barcodes, /generate_qrcode, /scan_barcode and /get_qr.
+
+Usage: python benchmarks/bench_endpoints.py [--mode inprocess|gunicorn|both]
+           [--concurrency 1,8,32] [--requests N] [--batch-size N] [--workers N] [--output FILE]
+
+Runs against local stand-ins for the database tables and the storage bucket (see
+standins.py), either in process through Flask's test client or over HTTP against
+gunicorn. For every mode, endpoint and concurrency level it reports throughput,
+p50/p95/p99 latency, status codes and the per-stage time recorded by the app's
+metrics, as JSON. Compare the JSON of two runs to catch regressions.
+
+Each /generate_barcodes request carries --batch-size items; the "bulk_vs_single"
+section compares its items per second with that of /generate_barcode at the same
+mode and concurrency.
+
+Stand-in latency is set with BENCH_DB_LATENCY_MS, BENCH_CONNECT_LATENCY_MS and
+BENCH_STORAGE_LATENCY_MS, and any app setting (DB_POOL_MAX, LOOKUP_CACHE_TTL, ...)
+can be passed through the environment.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+ENDPOINTS = ("generate_barcode", "generate_barcodes", "generate_qrcode", "scan_barcode", "get_qr")
+
+STAGE_SAMPLE = re.compile(
+    r'^barcode_stage_duration_seconds_(sum|count)\{endpoint="([^"]*)",stage="([^"]*)"\} (\S+)$'
+)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Workload:
+    """Builds request bodies; creates use fresh GTINs and names, reads use seeded rows."""
+
+    def __init__(self, seed_rows, batch_size):
+        self.seed_rows = seed_rows
+        self.batch_size = batch_size
+        self._counter = 0
+        self._lock = threading.Lock()
+        # Distinct per run, so repeated runs against the same server do not collide
+        self._run = random.randrange(10 ** 5)
+
+    def _next(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def body(self, endpoint):
+        if endpoint == "generate_barcode":
+            n = self._next()
+            return {"name": f"Bench product {n}", "price": 1.5, "gtin": f"3{self._run:05d}{n:06d}"}
+        if endpoint == "generate_barcodes":
+            return [self.body("generate_barcode") for _ in range(self.batch_size)]
+        if endpoint == "generate_qrcode":
+            return {"name": f"bench-{self._run}-{self._next()}", "price": 1.5}
+
+        import standins
+        i = random.randrange(self.seed_rows)
+        if endpoint == "scan_barcode":
+            return {"gtin": standins.seed_gtin(i)}
+        return {"name": standins.seed_qr_name(i)}
+
+
+class InProcessTarget:
+    """Sends requests through the WSGI app in this process."""
+
+    name = "inprocess"
+
+    def __init__(self, args):
+        import standins
+        self.app = standins.create_app()
+        self.metrics = standins.barcode_gen.metrics
+        self._local = threading.local()
+
+    def post(self, path, body):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(path, json=body)
+        return response.status_code, response.get_data()
+
+    def scrape(self):
+        return self.metrics.export()
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    """Starts gunicorn with the stand-in app factory and sends requests over HTTP."""
+
+    name = "gunicorn"
+
+    def __init__(self, args):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.metrics_dir = tempfile.mkdtemp(prefix="barcode-bench-metrics-")
+        self.flush_interval = 0.2
+        env = dict(
+            os.environ,
+            GUNICORN_BIND=f"127.0.0.1:{self.port}",
+            GUNICORN_WORKERS=str(args.workers),
+            GUNICORN_THREADS=str(args.threads),
+            METRICS_DIR=self.metrics_dir,
+            METRICS_FLUSH_INTERVAL=str(self.flush_interval),
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+             "--pythonpath", BENCH_DIR, "standins:create_app()"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self._wait_ready()
+        self._local = threading.local()
+
+    def _wait_ready(self, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("gunicorn exited during start-up")
+            try:
+                self.scrape()
+                return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("gunicorn did not become ready")
+
+    def post(self, path, body):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            # Sync workers close the connection after each response; reconnect and retry once
+            conn.close()
+            conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = response.read()
+        if response.getheader("Connection", "").lower() == "close":
+            conn.close()
+        return response.status, data
+
+    def scrape(self):
+        # Wait for every worker to flush its latest snapshot to METRICS_DIR
+        time.sleep(2 * self.flush_interval)
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.port}/metrics", timeout=5) as response:
+            return response.read().decode()
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+
+def stage_totals(text):
+    """Parses (endpoint, stage) -> [seconds, count] from Prometheus text."""
+    totals = {}
+    for line in text.splitlines():
+        match = STAGE_SAMPLE.match(line)
+        if match:
+            kind, endpoint, stage, value = match.groups()
+            totals.setdefault((endpoint, stage), [0.0, 0])[0 if kind == "sum" else 1] += float(value)
+    return totals
+
+
+def items_per_request(endpoint, workload):
+    return workload.batch_size if endpoint == "generate_barcodes" else 1
+
+
+def run_phase(target, workload, endpoint, concurrency, requests):
+    """Sends requests to one endpoint from concurrency threads; returns the phase result."""
+    path = f"/{endpoint}"
+    bodies = [workload.body(endpoint) for _ in range(requests)]
+    latencies = []
+    statuses = {}
+    item_errors = [0]
+    lock = threading.Lock()
+
+    def send(body):
+        started = time.perf_counter()
+        failed = 0
+        try:
+            status, data = target.post(path, body)
+            if endpoint == "generate_barcodes" and status == 200:
+                # A bulk request succeeds as a whole; its items can still fail one by one
+                failed = json.loads(data)["failed"]
+            status = str(status)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+            item_errors[0] += failed
+
+    before = stage_totals(target.scrape())
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, bodies))
+    duration = time.perf_counter() - started
+    after = stage_totals(target.scrape())
+
+    stages = {}
+    for (stage_endpoint, stage), (seconds, count) in sorted(after.items()):
+        if stage_endpoint != endpoint:
+            continue
+        previous_seconds, previous_count = before.get((stage_endpoint, stage), (0.0, 0))
+        count -= previous_count
+        if count:
+            seconds -= previous_seconds
+            stages[stage] = {
+                "count": int(count),
+                "mean_ms": 1000 * seconds / count,
+                "ms_per_request": 1000 * seconds / requests,
+                "ms_per_item": 1000 * seconds / (requests * items_per_request(endpoint, workload)),
+            }
+
+    latencies.sort()
+    errors = sum(n for status, n in statuses.items() if not status.startswith("2"))
+    items = items_per_request(endpoint, workload)
+    return {
+        "mode": target.name,
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "statuses": statuses,
+        "duration_s": duration,
+        "throughput_rps": requests / duration,
+        "items_per_request": items,
+        "item_errors": item_errors[0],
+        "items_per_second": (items * (requests - errors) - item_errors[0]) / duration,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / len(latencies),
+            "p50": 1000 * percentile(latencies, 0.50),
+            "p95": 1000 * percentile(latencies, 0.95),
+            "p99": 1000 * percentile(latencies, 0.99),
+            "max": 1000 * latencies[-1],
+        },
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("inprocess", "gunicorn", "both"), default="inprocess")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated endpoint names")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client thread counts")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and concurrency level")
+    parser.add_argument("--batch-size", type=int, default=100, help="items per /generate_barcodes request")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per endpoint before measuring")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    endpoints = [name for name in args.endpoints.split(",") if name]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+    modes = ("inprocess", "gunicorn") if args.mode == "both" else (args.mode,)
+
+    # Uploaded images go to a scratch directory shared by all workers
+    storage_dir = tempfile.mkdtemp(prefix="barcode-bench-storage-")
+    os.environ["LOCAL_STORAGE_DIR"] = storage_dir
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+    sys.path.insert(0, BENCH_DIR)
+
+    import standins
+    workload = Workload(standins.SEED_ROWS, args.batch_size)
+    results = []
+    try:
+        for mode in modes:
+            target = (InProcessTarget if mode == "inprocess" else GunicornTarget)(args)
+            try:
+                for endpoint in endpoints:
+                    for _ in range(args.warmup):
+                        target.post(f"/{endpoint}", workload.body(endpoint))
+                    for concurrency in levels:
+                        results.append(run_phase(target, workload, endpoint, concurrency, args.requests))
+            finally:
+                target.close()
+    finally:
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+    singles = {
+        (result["mode"], result["concurrency"]): result
+        for result in results if result["endpoint"] == "generate_barcode"
+    }
+    bulk_vs_single = []
+    for result in results:
+        single = singles.get((result["mode"], result["concurrency"]))
+        if result["endpoint"] == "generate_barcodes" and single:
+            bulk_vs_single.append({
+                "mode": result["mode"],
+                "concurrency": result["concurrency"],
+                "batch_size": result["items_per_request"],
+                "single_items_per_second": single["items_per_second"],
+                "bulk_items_per_second": result["items_per_second"],
+                "speedup": result["items_per_second"] / single["items_per_second"],
+            })
+
+    report = {
+        "config": {
+            "modes": list(modes),
+            "endpoints": endpoints,
+            "concurrency": levels,
+            "requests": args.requests,
+            "batch_size": args.batch_size,
+            "gunicorn_workers": args.workers,
+            "gunicorn_threads": args.threads,
+            "seed_rows": standins.SEED_ROWS,
+            "db_latency_ms": 1000 * standins.DB_LATENCY,
+            "connect_latency_ms": 1000 * standins.CONNECT_LATENCY,
+            "storage_latency_ms": 1000 * standins.STORAGE_LATENCY,
+            "db_pool_max": int(os.getenv("DB_POOL_MAX", "10")),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+        "bulk_vs_single": bulk_vs_single,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
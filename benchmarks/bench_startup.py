@@ -0,0 +1,130 @@
+"""Measures worker start-up cost: app import, and the first render a worker performs.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--workers N]
+
+Runs each measurement in fresh processes and prints medians as JSON:
+
+* ``import``: time to import barcode_gen in a new interpreter.
+* ``first_render``: time a worker takes to render its first barcode and QR code,
+  for a worker that imported the app itself ("cold", gunicorn without preload) and
+  for one forked from a master that ran create_app() ("preloaded").
+* ``gunicorn``: time from launching gunicorn until it answers GET /metrics, with
+  preload_app off and on.
+
+Storage is the local stand-in and no database is needed: connections are opened per
+worker after start-up, so their cost depends on the network and is not measured here.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENV = dict(os.environ, STORAGE_BACKEND="local", LOCAL_STORAGE_DIR=os.path.join(ROOT, "local_storage"))
+
+IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import barcode_gen
+print(time.perf_counter() - started)
+"""
+
+FIRST_RENDER_SCRIPT = """
+import os, sys, time
+import barcode_gen
+
+def first_render():
+    started = time.perf_counter()
+    barcode_gen.render_gs1_barcode("4006381333931", barcode_gen.BARCODE_RENDERER)
+    barcode_gen.render_qr_code("Product: bench, Price: 1")
+    return time.perf_counter() - started
+
+if sys.argv[1] == "preloaded":
+    barcode_gen.create_app()
+    read_end, write_end = os.pipe()
+    if os.fork() == 0:
+        os.write(write_end, repr(first_render()).encode())
+        os._exit(0)
+    os.close(write_end)
+    os.wait()
+    print(os.read(read_end, 64).decode())
+else:
+    print(first_render())
+"""
+
+
+def run_python(script, *args):
+    output = subprocess.run(
+        [sys.executable, "-c", script, *args],
+        cwd=ROOT, env=ENV, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def gunicorn_ready_seconds(workers, preload, timeout=60.0):
+    port = free_port()
+    env = dict(
+        ENV,
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_PRELOAD="1" if preload else "0"
+    )
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("gunicorn did not become ready")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarize(samples):
+    return {"runs": len(samples), "median_ms": 1000 * statistics.median(samples), "max_ms": 1000 * max(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="repetitions of each measurement")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    args = parser.parse_args()
+
+    results = {
+        "import": summarize([run_python(IMPORT_SCRIPT) for _ in range(args.runs)]),
+        "first_render": {
+            mode: summarize([run_python(FIRST_RENDER_SCRIPT, mode) for _ in range(args.runs)])
+            for mode in ("cold", "preloaded")
+        },
+        "gunicorn": {
+            ("preload" if preload else "no_preload"): summarize(
+                [gunicorn_ready_seconds(args.workers, preload) for _ in range(args.runs)]
+            )
+            for preload in (False, True)
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
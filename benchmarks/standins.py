@@ -0,0 +1,260 @@
+"""Local stand-ins for the products/qr_codes tables and the storage bucket.
+
+``create_app()`` is an app factory that imports barcode_gen with the stand-ins
+installed, so the service can be benchmarked without Postgres or Supabase, in
+process or under gunicorn ("standins:create_app()" with ``--pythonpath benchmarks``).
+Every process seeds the same rows, so reads behave the same on every worker.
+
+Settings (environment variables):
+
+* ``BENCH_SEED_ROWS``: products and QR codes seeded into the tables (default 1000).
+* ``BENCH_DB_LATENCY_MS``: delay added to every statement, a stand-in for the
+  round trip to the database (default 0).
+* ``BENCH_CONNECT_LATENCY_MS``: delay added to opening a connection (default 0).
+* ``BENCH_STORAGE_LATENCY_MS``: delay added to every upload (default 0).
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("STORAGE_BACKEND", "local")
+if "LOCAL_STORAGE_DIR" not in os.environ:
+    os.environ["LOCAL_STORAGE_DIR"] = tempfile.mkdtemp(prefix="barcode-bench-")
+os.environ.setdefault("SUPABASE_BUCKET", "barcodes")
+os.environ.setdefault("QR_CODE_BUCKET", "qr_codes")
+
+import barcode_gen
+from db import ConnectionPool
+from process_local import ProcessLocal
+from storage import LocalStorage
+
+SEED_ROWS = int(os.getenv("BENCH_SEED_ROWS", "1000"))
+DB_LATENCY = float(os.getenv("BENCH_DB_LATENCY_MS", "0")) / 1000
+CONNECT_LATENCY = float(os.getenv("BENCH_CONNECT_LATENCY_MS", "0")) / 1000
+STORAGE_LATENCY = float(os.getenv("BENCH_STORAGE_LATENCY_MS", "0")) / 1000
+
+
+def seed_gtin(i):
+    """GTIN-13 of the i-th seeded product."""
+    return barcode_gen.calculate_gtin13(f"{200000000000 + i:012d}")
+
+
+def seed_qr_name(i):
+    """Name of the i-th seeded QR code."""
+    return f"bench-seed-{i}"
+
+
+class Tables:
+    """In-memory products and qr_codes tables, keyed like their unique constraints."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.products = {}  # gtin -> (name, price, barcode_image_path)
+        self.qr_codes = {}  # name -> (name, price, qr_code_image_path)
+
+    def seed(self, count):
+        for i in range(count):
+            gtin = seed_gtin(i)
+            self.products[gtin] = (f"Seeded product {i}", 9.99, f"http://bench/barcodes/static/{gtin}.png")
+            name = seed_qr_name(i)
+            self.qr_codes[name] = (name, 9.99, f"http://bench/qr_codes/static/{name}_qr.png")
+
+
+def _sql(pattern):
+    return re.compile(pattern.replace(" ", r"\s+"), re.IGNORECASE)
+
+
+class Cursor:
+    """Executes the statements barcode_gen issues for creates, bulk creates and scans.
+
+    ``mogrify`` (used by ``execute_values``) returns a reference to the bound row
+    instead of quoted literals, and ``execute`` resolves the references again.
+    """
+
+    STATEMENTS = [
+        (_sql(r"INSERT INTO products \(name, price, gtin, barcode_image_path\) VALUES \(%s, %s, %s, %s\) "
+              r"ON CONFLICT \(gtin\) DO NOTHING RETURNING gtin"), "_insert_product"),
+        (_sql(r"INSERT INTO products \(name, price, gtin, barcode_image_path\) VALUES (?P<rows>#\d+(?:,#\d+)*) "
+              r"ON CONFLICT \(gtin\) DO NOTHING RETURNING gtin"), "_insert_products"),
+        (_sql(r"INSERT INTO qr_codes \(name, price, qr_code_image_path\) VALUES \(%s, %s, %s\) "
+              r"ON CONFLICT \(name\) DO NOTHING RETURNING name"), "_insert_qr"),
+        (_sql(r"DELETE FROM products WHERE gtin = %s"), "_delete_product"),
+        (_sql(r"DELETE FROM products WHERE gtin = ANY\(%s\)"), "_delete_products"),
+        (_sql(r"DELETE FROM qr_codes WHERE name = %s"), "_delete_qr"),
+        (_sql(r"SELECT name, price, barcode_image_path FROM products WHERE gtin = %s"), "_select_product"),
+        (_sql(r"SELECT gtin, name, price, barcode_image_path FROM products WHERE gtin = ANY\(%s\)"),
+         "_select_products"),
+        (_sql(r"SELECT gtin FROM products WHERE gtin = ANY\(%s\)"), "_select_gtins"),
+        (_sql(r"SELECT name, price, qr_code_image_path FROM qr_codes WHERE name = %s"), "_select_qr"),
+        (_sql(r"SELECT 1"), "_select_one"),
+    ]
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.tables = connection.tables
+        self._rows = []
+        self._bound = []
+
+    def mogrify(self, template, args):
+        self._bound.append(tuple(args))
+        return b"#%d" % (len(self._bound) - 1)
+
+    def execute(self, sql, params=()):
+        if self.connection.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        if isinstance(sql, bytes):
+            sql = sql.decode(self.connection.encoding)
+        if DB_LATENCY:
+            time.sleep(DB_LATENCY)
+        for pattern, handler in self.STATEMENTS:
+            match = pattern.fullmatch(sql.strip())
+            if match:
+                if "rows" in pattern.groupindex:
+                    params = ([self._bound[int(ref[1:])] for ref in match.group("rows").split(",")],)
+                    self._bound = []
+                with self.tables.lock:
+                    self._rows = getattr(self, handler)(*params)
+                self.connection.in_transaction = not self.connection.autocommit
+                return
+        raise psycopg2.NotSupportedError(f"Statement not supported by the stand-in: {sql}")
+
+    def _insert_product(self, name, price, gtin, barcode_image_path):
+        if gtin in self.tables.products:
+            return []
+        self.tables.products[gtin] = (name, price, barcode_image_path)
+        return [(gtin,)]
+
+    def _insert_products(self, rows):
+        inserted = []
+        for name, price, gtin, barcode_image_path in rows:
+            inserted.extend(self._insert_product(name, price, gtin, barcode_image_path))
+        return inserted
+
+    def _insert_qr(self, name, price, qr_code_image_path):
+        if name in self.tables.qr_codes:
+            return []
+        self.tables.qr_codes[name] = (name, price, qr_code_image_path)
+        return [(name,)]
+
+    def _delete_product(self, gtin):
+        self.tables.products.pop(gtin, None)
+        return []
+
+    def _delete_products(self, gtins):
+        for gtin in gtins:
+            self.tables.products.pop(gtin, None)
+        return []
+
+    def _delete_qr(self, name):
+        self.tables.qr_codes.pop(name, None)
+        return []
+
+    def _select_product(self, gtin):
+        row = self.tables.products.get(gtin)
+        return [row] if row else []
+
+    def _select_products(self, gtins):
+        return [(gtin,) + self.tables.products[gtin] for gtin in gtins if gtin in self.tables.products]
+
+    def _select_gtins(self, gtins):
+        return [(gtin,) for gtin in gtins if gtin in self.tables.products]
+
+    def _select_qr(self, name):
+        row = self.tables.qr_codes.get(name)
+        return [row] if row else []
+
+    def _select_one(self):
+        return [(1,)]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class Connection:
+    """Minimal psycopg2-like connection over the in-memory tables."""
+
+    encoding = "UTF8"
+
+    def __init__(self, tables):
+        if CONNECT_LATENCY:
+            time.sleep(CONNECT_LATENCY)
+        self.tables = tables
+        self.closed = 0
+        self.autocommit = False
+        self.in_transaction = False
+
+    def cursor(self):
+        return Cursor(self)
+
+    def _end_transaction(self):
+        # COMMIT and ROLLBACK are round trips only when a transaction is open
+        if self.in_transaction and DB_LATENCY:
+            time.sleep(DB_LATENCY)
+        self.in_transaction = False
+
+    def commit(self):
+        self._end_transaction()
+
+    def rollback(self):
+        self._end_transaction()
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        if self.in_transaction:
+            return extensions.TRANSACTION_STATUS_INTRANS
+        return extensions.TRANSACTION_STATUS_IDLE
+
+
+class DelayedLocalStorage(LocalStorage):
+    """LocalStorage that waits before each upload, a stand-in for the storage round trip."""
+
+    def upload(self, bucket, path, data, content_type, upsert=False):
+        if STORAGE_LATENCY:
+            time.sleep(STORAGE_LATENCY)
+        super().upload(bucket, path, data, content_type, upsert)
+
+
+def connect(tables):
+    """Opens a stand-in connection configured like barcode_gen.connect_db."""
+    conn = Connection(tables)
+    conn.autocommit = True
+    return conn
+
+
+def create_app():
+    """App factory that installs the stand-ins into barcode_gen and seeds the tables."""
+    tables = Tables()
+    tables.seed(SEED_ROWS)
+
+    pool = barcode_gen.db_pool.peek()
+    if pool is not None:
+        pool.closeall()
+    # Same pool settings as the app, with the stand-in behind the connect callable
+    barcode_gen.db_pool = ProcessLocal(lambda: ConnectionPool(
+        lambda: connect(tables),
+        minconn=int(os.getenv("DB_POOL_MIN", "1")),
+        maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        health_check_interval=float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "30"))
+    ))
+
+    storage = DelayedLocalStorage(os.environ["LOCAL_STORAGE_DIR"], "http://bench")
+    barcode_gen.storage = storage
+    barcode_gen.upload_queue.storage = storage
+    return barcode_gen.create_app()
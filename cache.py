@@ -0,0 +1,298 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class ImageCache:
+    """Bounded LRU cache of rendered images, keyed on what was rendered.
+
+    Keys are (symbology, payload, writer options) tuples and values are the encoded
+    image bytes. The cache holds at most ``max_bytes`` of image data; the least
+    recently used entries are evicted once that bound is exceeded.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """Returns the cached bytes for key, calling render() to produce them on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class MemoryBackend:
+    """In-process TTL store with LRU eviction once ``max_entries`` is reached."""
+
+    shared = False  # each worker has its own
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def get_many(self, keys):
+        """Returns the values of keys, in order, with None for missing keys."""
+        with self._lock:
+            now = time.monotonic()
+            return [self._get(key, now) for key in keys]
+
+    def set(self, key, value, ttl):
+        self.set_many([(key, value, ttl)])
+
+    def set_many(self, items):
+        """Stores (key, value, ttl) items."""
+        with self._lock:
+            now = time.monotonic()
+            for key, value, ttl in items:
+                self._entries[key] = (value, now + ttl)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """TTL store shared by every worker through Redis (requires the ``redis`` package)."""
+
+    shared = True
+
+    def __init__(self, url, prefix="barcode:"):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def get_many(self, keys):
+        """Returns the values of keys, in order, with None for missing keys, in one MGET."""
+        if not keys:
+            return []
+        values = self._client.mget([self.prefix + key for key in keys])
+        return [None if raw is None else json.loads(raw) for raw in values]
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, json.dumps(value, default=str), ex=max(1, int(ttl)))
+
+    def set_many(self, items):
+        """Stores (key, value, ttl) items in one pipelined round trip."""
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value, ttl in items:
+            pipeline.set(self.prefix + key, json.dumps(value, default=str), ex=max(1, int(ttl)))
+        pipeline.execute()
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def size(self):
+        return None
+
+
+class LookupCache:
+    """Read-through cache for single-row lookups, including negative results.
+
+    Rows are loaded with ``loader(key)`` on a miss. Lookups that find nothing are
+    cached too, for ``negative_ttl`` seconds, so repeated scans of unknown codes do
+    not reach the database either.
+
+    Keys marked pending (rows stored before their image is uploaded, which are
+    deleted again if the upload fails) are only cached for ``negative_ttl`` while
+    the mark lasts, at most ``pending_ttl`` seconds. Marks and invalidations reach
+    other workers only through a shared backend.
+    """
+
+    def __init__(self, namespace, backend, ttl, negative_ttl, pending_ttl=None):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.pending_ttl = pending_ttl if pending_ttl is not None else ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _pending_key(self, key):
+        return f"pending:{self.namespace}:{key}"
+
+    def _ttls(self, rows):
+        """Returns the TTL to cache each of {key: row} with, checking pending marks in one call."""
+        found = [key for key, row in rows.items() if row is not None]
+        marks = self.backend.get_many([self._pending_key(key) for key in found]) if found else []
+        pending = {key for key, mark in zip(found, marks) if mark is not None}
+        return {
+            key: self.ttl if row is not None and key not in pending else self.negative_ttl
+            for key, row in rows.items()
+        }
+
+    def mark_pending(self, keys):
+        """Marks keys whose rows may still be deleted, before those rows are inserted."""
+        self.backend.set_many([(self._pending_key(key), True, self.pending_ttl) for key in keys])
+
+    def clear_pending(self, keys):
+        """Removes the pending marks of keys whose rows are now final."""
+        for key in keys:
+            self.backend.delete(self._pending_key(key))
+
+    def get_or_load(self, key, loader):
+        """Returns the cached row for key, or loads, caches and returns it."""
+        started = time.perf_counter()
+        entry = self.backend.get(self._key(key))
+        if entry is not None:
+            with self._lock:
+                if entry["row"] is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                self.hit_seconds += time.perf_counter() - started
+            return entry["row"]
+
+        row = loader(key)
+        self.backend.set(self._key(key), {"row": row}, self._ttls({key: row})[key])
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - started
+        return row
+
+    def get_many_or_load(self, keys, loader):
+        """Returns {key: row} for keys, loading every miss with one ``loader(missing)`` call.
+
+        ``loader`` receives the list of missing keys and returns a {key: row} dict;
+        keys absent from it are cached as negative results.
+        """
+        started = time.perf_counter()
+        rows = {}
+        missing = []
+        hits = negative_hits = 0
+        keys = list(dict.fromkeys(keys))
+        # One backend call for all keys: a single MGET with Redis
+        entries = self.backend.get_many([self._key(key) for key in keys])
+        for key, entry in zip(keys, entries):
+            if entry is None:
+                missing.append(key)
+                continue
+            rows[key] = entry["row"]
+            if entry["row"] is None:
+                negative_hits += 1
+            else:
+                hits += 1
+        hit_elapsed = time.perf_counter() - started
+
+        if missing:
+            loaded = loader(missing)
+            loaded = {key: loaded.get(key) for key in missing}
+            ttls = self._ttls(loaded)
+            rows.update(loaded)
+            self.backend.set_many([(self._key(key), {"row": row}, ttls[key]) for key, row in loaded.items()])
+
+        with self._lock:
+            self.hits += hits
+            self.negative_hits += negative_hits
+            self.misses += len(missing)
+            self.hit_seconds += hit_elapsed
+            if missing:
+                self.miss_seconds += time.perf_counter() - started - hit_elapsed
+        return rows
+
+    def invalidate(self, key):
+        self.backend.delete(self._key(key))
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits + self.negative_hits
+            lookups = hits + self.misses
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "avg_hit_ms": 1000 * self.hit_seconds / hits if hits else 0.0,
+                "avg_miss_ms": 1000 * self.miss_seconds / self.misses if self.misses else 0.0,
+                "backend_entries": self.backend.size(),
+            }
+
+
+def create_cache_backend(name, max_entries, redis_url=None):
+    """Creates the lookup cache backend selected by name ("memory" or "redis")."""
+    if name == "redis":
+        if not redis_url:
+            raise ValueError("REDIS_URL is required for the redis cache backend")
+        return RedisBackend(redis_url)
+    if name == "memory":
+        return MemoryBackend(max_entries)
+    raise ValueError(f"Unknown cache backend: {name}")
@@ -0,0 +1,183 @@
+"""Fast EAN-13 rendering.
+
+Computes the bar pattern from the L/G/R encoding tables and paints it as a single
+NumPy operation, instead of drawing module by module like python-barcode's
+ImageWriter. The output has the same geometry as ImageWriter with the EAN-13
+defaults: 0.33 mm modules, 15 mm bars, 6.5 mm quiet zones and the 13 digits
+centred 5 mm below the bars, at 300 dpi.
+"""
+import io
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Element widths are encoded as module strings, "1" for a bar and "0" for a space
+L_CODES = ("0001101", "0011001", "0010011", "0111101", "0100011",
+           "0110001", "0101111", "0111011", "0110111", "0001011")
+G_CODES = ("0100111", "0110011", "0011011", "0100001", "0011101",
+           "0111001", "0000101", "0010001", "0001001", "0010111")
+R_CODES = ("1110010", "1100110", "1101100", "1000010", "1011100",
+           "1001110", "1010000", "1000100", "1001000", "1110100")
+
+# Which of L or G encodes each left-hand digit, selected by the first digit
+PARITY = ("LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+          "LGGLLG", "LGGGLG", "LGLGLL", "LGLGGL", "LGGLGL")
+
+EDGE_GUARD = "101"
+CENTRE_GUARD = "01010"
+MODULES = 95
+
+MODULE_WIDTH = 0.33  # mm
+MODULE_HEIGHT = 15.0  # mm
+QUIET_ZONE = 6.5  # mm
+MARGIN_TOP = 1.0  # mm
+MARGIN_BOTTOM = 1.0  # mm
+TEXT_DISTANCE = 5.0  # mm
+FONT_SIZE = 10  # pt
+DPI = 300
+
+_DIGIT_MODULES = {
+    table: tuple(np.array([c == "1" for c in code], dtype=bool) for code in codes)
+    for table, codes in (("L", L_CODES), ("G", G_CODES), ("R", R_CODES))
+}
+_EDGE = np.array([c == "1" for c in EDGE_GUARD], dtype=bool)
+_CENTRE = np.array([c == "1" for c in CENTRE_GUARD], dtype=bool)
+
+_font_lock = threading.Lock()
+
+
+def mm2px(mm, dpi=DPI):
+    return mm * dpi / 25.4
+
+
+def pt2mm(pt):
+    return pt * 0.352777778
+
+
+def encode(gtin):
+    """Returns the 95 modules of an EAN-13 symbol as a boolean array (True = bar)."""
+    if len(gtin) != 13 or not gtin.isdigit():
+        raise ValueError("EAN-13 requires exactly 13 digits")
+
+    parity = PARITY[int(gtin[0])]
+    parts = [_EDGE]
+    for table, digit in zip(parity, gtin[1:7]):
+        parts.append(_DIGIT_MODULES[table][int(digit)])
+    parts.append(_CENTRE)
+    for digit in gtin[7:]:
+        parts.append(_DIGIT_MODULES["R"][int(digit)])
+    parts.append(_EDGE)
+    return np.concatenate(parts)
+
+
+def symbol_size_mm():
+    """Returns the (width, height) of the symbol in millimetres, including quiet zones."""
+    width = 2 * QUIET_ZONE + MODULES * MODULE_WIDTH
+    height = MARGIN_TOP + MODULE_HEIGHT + MARGIN_BOTTOM + pt2mm(FONT_SIZE) / 2 + TEXT_DISTANCE
+    return width, height
+
+
+@lru_cache(maxsize=None)
+def _layout(dpi):
+    """Precomputes the pixel geometry shared by every symbol rendered at dpi."""
+    width_mm, height_mm = symbol_size_mm()
+    width, height = int(mm2px(width_mm, dpi)), int(mm2px(height_mm, dpi))
+
+    # Pixel columns covered by each module, truncated the same way ImageWriter does
+    edges = [int(mm2px(QUIET_ZONE + i * MODULE_WIDTH, dpi)) for i in range(MODULES + 1)]
+    columns = np.arange(edges[0], edges[-1])
+    module_of_column = np.searchsorted(edges, columns, side="right") - 1
+
+    bar_top = int(mm2px(MARGIN_TOP, dpi))
+    bar_bottom = int(mm2px(MARGIN_TOP + MODULE_HEIGHT, dpi)) + 1
+    text_x = mm2px(QUIET_ZONE + MODULES * MODULE_WIDTH / 2, dpi)
+    text_y = mm2px(MARGIN_TOP + MODULE_HEIGHT + TEXT_DISTANCE, dpi)
+    return width, height, columns, module_of_column, bar_top, bar_bottom, text_x, text_y
+
+
+@lru_cache(maxsize=None)
+def _font(dpi):
+    # Use the font python-barcode ships so the digits look the same as ImageWriter's
+    import barcode.writer
+
+    font_path = os.path.join(os.path.dirname(barcode.writer.__file__), "fonts", "DejaVuSansMono.ttf")
+    return ImageFont.truetype(font_path, int(mm2px(pt2mm(FONT_SIZE), dpi)))
+
+
+@lru_cache(maxsize=None)
+def _glyphs(dpi):
+    """Renders each digit once; returns (advance, line height, {digit: coverage})."""
+    font = _font(dpi)
+    ascent, descent = font.getmetrics()
+    advance = font.getlength("0")
+    cell_width = int(advance) + 2
+    glyphs = {}
+    with _font_lock:
+        for digit in "0123456789":
+            cell = Image.new("L", (cell_width, ascent + descent), 0)
+            ImageDraw.Draw(cell).text((0, ascent), digit, font=font, fill=255, anchor="ls")
+            glyphs[digit] = np.asarray(cell, dtype=np.uint8)
+    return advance, ascent + descent, glyphs
+
+
+def render_array(gtin, dpi=DPI, text=True):
+    """Renders the symbol to a greyscale (0 = black, 255 = white) uint8 array."""
+    width, height, columns, module_of_column, bar_top, bar_bottom, text_x, text_y = _layout(dpi)
+    image = np.full((height, width), 255, dtype=np.uint8)
+
+    bars = encode(gtin)[module_of_column]
+    image[bar_top:bar_bottom, columns[bars]] = 0
+
+    if text:
+        advance, line_height, glyphs = _glyphs(dpi)
+        # Same anchor as ImageWriter: horizontally centred, descender line at text_y
+        left = text_x - advance * len(gtin) / 2
+        top = int(round(text_y)) - line_height
+        for i, digit in enumerate(gtin):
+            coverage = glyphs[digit]
+            x = int(round(left + i * advance))
+            region = image[top:top + coverage.shape[0], x:x + coverage.shape[1]]
+            np.minimum(region, 255 - coverage[:region.shape[0], :region.shape[1]], out=region)
+    return image
+
+
+def render_png(gtin, dpi=DPI):
+    """Renders the symbol as PNG bytes."""
+    buffer = io.BytesIO()
+    Image.fromarray(render_array(gtin, dpi), mode="L").save(buffer, format="PNG", dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+
+def render_svg(gtin):
+    """Renders the symbol as SVG bytes, with one rect per run of bar modules."""
+    width_mm, height_mm = symbol_size_mm()
+    modules = encode(gtin)
+    rects = []
+    start = None
+    for i, bar in enumerate(np.append(modules, False)):
+        if bar and start is None:
+            start = i
+        elif not bar and start is not None:
+            rects.append(
+                f'<rect x="{QUIET_ZONE + start * MODULE_WIDTH:.3f}mm" y="{MARGIN_TOP:.3f}mm" '
+                f'width="{(i - start) * MODULE_WIDTH:.3f}mm" height="{MODULE_HEIGHT:.3f}mm" '
+                f'style="fill:black;"/>'
+            )
+            start = None
+
+    text_x = QUIET_ZONE + MODULES * MODULE_WIDTH / 2
+    text_y = MARGIN_TOP + MODULE_HEIGHT + TEXT_DISTANCE
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+        f'width="{width_mm:.3f}mm" height="{height_mm:.3f}mm">'
+        f'<rect width="100%" height="100%" style="fill:white;"/>'
+        f'{"".join(rects)}'
+        f'<text x="{text_x:.3f}mm" y="{text_y:.3f}mm" '
+        f'style="fill:black;font-size:{FONT_SIZE}pt;text-anchor:middle;font-family:monospace;">'
+        f'{gtin}</text>'
+        f'</svg>'
+    ).encode()
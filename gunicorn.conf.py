@@ -0,0 +1,51 @@
+"""Gunicorn settings for the barcode service (used by start.sh).
+
+The app is preloaded in the master through the create_app() factory, which imports
+and warms up the renderers but opens no connections. Each worker then opens its own
+database pool and storage client in post_worker_init, before taking requests.
+
+Workers write their metrics snapshots to METRICS_DIR so that /metrics reports all of
+them; unless it is set, a directory under /tmp is used for each start of the master.
+"""
+import os
+import tempfile
+
+from metrics import Metrics
+
+wsgi_app = "barcode_gen:create_app()"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+# Bulk requests run synchronously; keep BULK_MAX_ITEMS small enough to finish within it
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Read by the app when it is imported, in the master with preload_app or in each worker
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"barcode-metrics-{os.getpid()}"))
+
+
+def on_starting(server):
+    Metrics(os.environ["METRICS_DIR"]).clear()
+
+
+def post_worker_init(worker):
+    import barcode_gen
+    barcode_gen.init_worker(only_worker=worker.cfg.workers == 1)
+
+
+def worker_exit(server, worker):
+    import barcode_gen
+    barcode_gen.shutdown_worker()
+
+
+def child_exit(server, worker):
+    # Runs in the master, which does not need the app loaded to find the worker's snapshot
+    Metrics(os.environ["METRICS_DIR"]).remove_process(worker.pid)
+
+
+def on_exit(server):
+    Metrics(os.environ["METRICS_DIR"]).clear()
+    try:
+        os.rmdir(os.environ["METRICS_DIR"])
+    except OSError:
+        pass  # not empty, or never created
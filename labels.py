@@ -0,0 +1,251 @@
+"""Print-ready label sheets.
+
+Barcode and QR code tiles are rendered in a process pool and pasted straight into
+a page bitmap. Pages are produced one at a time (the next page's tiles render while
+the current one is assembled and written out), so memory stays bounded by about
+two pages regardless of how many labels a sheet has.
+"""
+import io
+import math
+import multiprocessing
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import ean13
+
+PAGE_SIZES = {  # width, height in mm
+    "A4": (210.0, 297.0),
+    "A5": (148.0, 210.0),
+    "letter": (215.9, 279.4),
+    "legal": (215.9, 355.6),
+}
+# Custom page sizes may be up to the largest named one, in either orientation
+MAX_PAGE_SIZE = (max(min(size) for size in PAGE_SIZES.values()), max(max(size) for size in PAGE_SIZES.values()))
+
+class Layout:
+    """Page geometry for a label sheet; all lengths are in millimetres."""
+
+    def __init__(self, page_size="A4", rows=10, columns=4, margin=10.0, gutter=2.0, dpi=300):
+        if isinstance(page_size, str):
+            if page_size not in PAGE_SIZES:
+                raise ValueError(f"Unknown page size: {page_size}")
+            page_size = PAGE_SIZES[page_size]
+        self.page_width, self.page_height = (float(v) for v in page_size)
+        self.rows = int(rows)
+        self.columns = int(columns)
+        self.margin = float(margin)
+        self.gutter = float(gutter)
+        self.dpi = int(dpi)
+
+        if not 1 <= self.rows <= 100 or not 1 <= self.columns <= 100:
+            raise ValueError("Rows and columns must be between 1 and 100")
+        if not 72 <= self.dpi <= 600:
+            raise ValueError("DPI must be between 72 and 600")
+        short_side, long_side = sorted((self.page_width, self.page_height))
+        if not (0 < short_side <= MAX_PAGE_SIZE[0] and long_side <= MAX_PAGE_SIZE[1]):
+            raise ValueError(f"Page size must be positive and at most {MAX_PAGE_SIZE[0]} x {MAX_PAGE_SIZE[1]} mm")
+        if self.cell_width <= 0 or self.cell_height <= 0:
+            raise ValueError("Margins and gutters leave no room for labels")
+
+    @classmethod
+    def from_dict(cls, options):
+        allowed = {"page_size", "rows", "columns", "margin", "gutter", "dpi"}
+        unknown = set(options) - allowed
+        if unknown:
+            raise ValueError(f"Unknown layout options: {', '.join(sorted(unknown))}")
+        try:
+            return cls(**options)
+        except TypeError as e:
+            raise ValueError(str(e))
+
+    @property
+    def labels_per_page(self):
+        return self.rows * self.columns
+
+    @property
+    def cell_width(self):
+        return (self.page_width - 2 * self.margin - (self.columns - 1) * self.gutter) / self.columns
+
+    @property
+    def cell_height(self):
+        return (self.page_height - 2 * self.margin - (self.rows - 1) * self.gutter) / self.rows
+
+    def px(self, mm):
+        return int(round(mm * self.dpi / 25.4))
+
+    def cell_origin(self, index):
+        row, column = divmod(index, self.columns)
+        x = self.margin + column * (self.cell_width + self.gutter)
+        y = self.margin + row * (self.cell_height + self.gutter)
+        return self.px(x), self.px(y)
+
+
+# Bytes a version 40 QR code holds in byte mode at error correction level L; qrcode
+# only switches parts of the data to numeric or alphanumeric mode when that is shorter
+QR_MAX_BYTES = 2953
+
+
+def make_qr(payload):
+    """Builds the QRCode for a label, at box size 1 and without its matrix."""
+    import qrcode
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=1, border=4)
+    qr.add_data(payload)
+    return qr
+
+
+def validate_qr_payload(payload):
+    """Returns payload if it fits in a QR code, raising ValueError otherwise."""
+    if len(payload.encode("utf-8")) <= QR_MAX_BYTES:
+        return payload
+    from qrcode.exceptions import DataOverflowError
+
+    # Digits or capitals can fit beyond that; best_fit sizes the data without rendering
+    try:
+        make_qr(payload).best_fit()
+    except (ValueError, DataOverflowError):
+        raise ValueError("QR payload is too long to fit in a QR code")
+    return payload
+
+
+def render_tile(kind, payload, dpi, max_width, max_height):
+    """Renders one label as greyscale pixels fitted to the cell; returns (size, raw bytes).
+
+    Runs in the process pool, so it returns plain bytes rather than an Image.
+    """
+    if kind == "gtin":
+        image = Image.fromarray(ean13.render_array(payload, dpi), mode="L")
+    else:
+        qr = make_qr(payload)
+        qr.make(fit=True)
+        modules = qr.modules_count + 2 * qr.border
+        qr.box_size = max(1, min(max_width, max_height) // modules)
+        image = qr.make_image(fill_color="black", back_color="white").get_image().convert("L")
+
+    if image.width > max_width or image.height > max_height:
+        image.thumbnail((max_width, max_height), Image.LANCZOS)
+    return image.size, image.tobytes()
+
+
+def create_executor(workers):
+    """Creates the process pool that renders tiles.
+
+    Workers are spawned, not forked: they import only this module, not the web app,
+    and share no connections or locks with it.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def render_pages(items, layout, executor):
+    """Yields one greyscale page Image per page of (kind, payload) items."""
+    cell_width, cell_height = layout.px(layout.cell_width), layout.px(layout.cell_height)
+    per_page = layout.labels_per_page
+    page_count = math.ceil(len(items) / per_page)
+
+    def submit(page):
+        return [
+            executor.submit(render_tile, kind, payload, layout.dpi, cell_width, cell_height)
+            for kind, payload in items[page * per_page:(page + 1) * per_page]
+        ]
+
+    pending = submit(0) if page_count else []
+    for page in range(page_count):
+        futures, pending = pending, (submit(page + 1) if page + 1 < page_count else [])
+        canvas = Image.new("L", (layout.px(layout.page_width), layout.px(layout.page_height)), 255)
+        for index, future in enumerate(futures):
+            size, data = future.result()
+            x, y = layout.cell_origin(index)
+            # Centre the tile in its cell
+            x += (cell_width - size[0]) // 2
+            y += (cell_height - size[1]) // 2
+            canvas.paste(Image.frombytes("L", size, data), (x, y))
+        yield canvas
+
+
+def stream_pdf(pages, layout):
+    """Streams pages as a PDF, one full-page greyscale image per page, without buffering the file."""
+    offsets = {}
+    position = 0
+    page_ids = []
+    width_pt = layout.page_width * 72 / 25.4
+    height_pt = layout.page_height * 72 / 25.4
+
+    def obj(number, body):
+        nonlocal position
+        offsets[number] = position
+        chunk = f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+        position += len(chunk)
+        return chunk
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position += len(header)
+    yield header
+
+    # Objects 1 (catalog) and 2 (page tree) are written last, once all pages are known
+    next_id = 3
+    for page in pages:
+        image_id, content_id, page_id = next_id, next_id + 1, next_id + 2
+        next_id += 3
+        data = zlib.compress(page.tobytes(), 6)
+        yield obj(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode "
+            f"/Length {len(data)} >>\nstream\n"
+        ).encode() + data + b"\nendstream")
+        content = f"q {width_pt:.2f} 0 0 {height_pt:.2f} 0 0 cm /Im0 Do Q".encode()
+        yield obj(content_id, f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+        yield obj(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.2f} {height_pt:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode())
+        page_ids.append(page_id)
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    yield obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode())
+    yield obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    xref = [f"xref\n0 {next_id}\n", "0000000000 65535 f \n"]
+    for number in range(1, next_id):
+        xref.append(f"{offsets[number]:010d} 00000 n \n")
+    xref.append(f"trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n")
+    yield "".join(xref).encode()
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are drained after each page."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_png(pages, layout, page_count):
+    """Streams a single page as PNG, or several pages as a ZIP of PNGs."""
+    if page_count == 1:
+        for page in pages:
+            buffer = io.BytesIO()
+            page.save(buffer, format="PNG", dpi=(layout.dpi, layout.dpi))
+            yield buffer.getvalue()
+        return
+
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for number, page in enumerate(pages, start=1):
+            png = io.BytesIO()
+            page.save(png, format="PNG", dpi=(layout.dpi, layout.dpi))
+            archive.writestr(f"page-{number:04d}.png", png.getvalue())
+            yield buffer.drain()
+    yield buffer.drain()
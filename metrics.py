@@ -0,0 +1,230 @@
+import bisect
+import contextvars
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; chosen to separate cache hits (sub-ms) from DB round trips
+# and uploads (tens to hundreds of ms)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Endpoint the current request is serving, used to label stage timings
+current_endpoint = contextvars.ContextVar("current_endpoint", default="background")
+
+
+class Metrics:
+    """Always-on counters and latency histograms, exported in Prometheus text format.
+
+    Recording is a perf_counter call, a bisect and a locked increment. With a
+    ``directory`` configured, every process writes its snapshot there (see
+    ``flush``) and ``export`` merges the snapshots of all gunicorn workers.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0, buckets=DEFAULT_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._counters = {}  # (name, labels) -> value
+        self._collectors = []
+        self._help = {}
+        self._flusher = None
+        self._flusher_pid = None
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            values[index] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def error(self, stage):
+        """Counts a failure in a stage of the current endpoint."""
+        self.inc("barcode_stage_errors_total", endpoint=current_endpoint.get(), stage=stage)
+
+    @contextmanager
+    def stage(self, name):
+        """Times a block as one stage of the current endpoint; exceptions count as errors."""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.error(name)
+            raise
+        finally:
+            self.observe(
+                "barcode_stage_duration_seconds",
+                time.perf_counter() - started,
+                endpoint=current_endpoint.get(),
+                stage=name
+            )
+
+    def timed(self, stage):
+        """Decorator form of ``stage``."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def bind(self, fn):
+        """Wraps fn so that, when run on a worker thread, it is labelled with the current endpoint."""
+        endpoint = current_endpoint.get()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            current_endpoint.set(endpoint)
+            return fn(*args, **kwargs)
+        return wrapper
+
+    def add_collector(self, collect):
+        """Registers a callable returning (kind, name, labels, value) samples at export time."""
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = [[name, labels, list(values)] for (name, labels), values in self._histograms.items()]
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+        gauges = []
+        for collect in self._collectors:
+            for kind, name, labels, value in collect():
+                labels = tuple(sorted(labels.items()))
+                (counters if kind == "counter" else gauges).append([name, labels, value])
+        return {
+            "pid": os.getpid(),
+            "buckets": list(self.buckets),
+            "histograms": histograms,
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self):
+        """Writes this process's snapshot to the shared directory."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def start_flusher(self):
+        """Starts (once per process) a daemon thread that flushes periodically."""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"Error writing metrics: {e}")
+
+        self._flusher = threading.Thread(target=run, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+
+    def remove_process(self, pid):
+        """Drops the snapshot of a worker that exited (for gunicorn's child_exit hook)."""
+        if self.directory:
+            try:
+                os.remove(self._path(pid))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Drops every process's snapshot, for a master starting up: child_exit does
+        not run for workers that were killed hard, and their files would be merged forever."""
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, "metrics-*.json*")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def export(self):
+        """Renders the metrics of every worker, merged, in Prometheus text format."""
+        histograms, counters, gauges = {}, {}, {}
+        for snapshot in self._snapshots():
+            for name, labels, values in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    merged[i] += value
+            for samples, merged in ((snapshot["counters"], counters), (snapshot["gauges"], gauges)):
+                for name, labels, value in samples:
+                    key = (name, tuple(map(tuple, labels)))
+                    merged[key] = merged.get(key, 0) + value
+
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            kind, text = self._help.get(name, (kind, name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{_labels(labels)} {values[-1]}")
+        for kind, samples in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in sorted(samples.items()):
+                header(name, kind)
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
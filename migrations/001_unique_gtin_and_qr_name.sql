@@ -0,0 +1,4 @@
+-- Creation reserves a GTIN or QR code name with INSERT ... ON CONFLICT DO NOTHING,
+-- which needs a unique index to conflict on.
+CREATE UNIQUE INDEX IF NOT EXISTS products_gtin_key ON products (gtin);
+CREATE UNIQUE INDEX IF NOT EXISTS qr_codes_name_key ON qr_codes (name);
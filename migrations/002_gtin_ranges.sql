@@ -0,0 +1,8 @@
+-- Server-side GTIN allocation: one row per GS1 company prefix holding the next
+-- unallocated item reference. Workers claim blocks of references by advancing
+-- next_ref with a single UPDATE ... RETURNING, so no two workers get the same block.
+CREATE TABLE IF NOT EXISTS gtin_ranges (
+    company_prefix TEXT PRIMARY KEY,
+    next_ref BIGINT NOT NULL DEFAULT 0,
+    max_ref BIGINT NOT NULL
+);
@@ -0,0 +1,55 @@
+import os
+import threading
+import weakref
+
+_instances = weakref.WeakSet()
+
+# Values inherited from a parent process. They are kept referenced, never closed or
+# collected, because closing a copied connection would tear down the parent's session.
+_inherited = []
+
+
+class ProcessLocal:
+    """Holds a value that is created on first use, separately in every process.
+
+    Connection pools and API clients own sockets, so they must not be shared by
+    gunicorn workers forked from a preloaded master. A ``ProcessLocal`` is cheap to
+    create at import time; ``get`` builds the value in the calling process, and a
+    forked child starts from scratch instead of reusing its parent's value.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._pid = None
+        _instances.add(self)
+
+    def get(self):
+        """Returns this process's value, creating it on first use."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._value = self._factory()
+                    self._pid = os.getpid()
+        return self._value
+
+    def peek(self):
+        """Returns this process's value, or None if it has not been created yet."""
+        return self._value if self._pid == os.getpid() else None
+
+    def _after_fork(self):
+        # The lock may have been held by a thread that does not exist in the child
+        self._lock = threading.Lock()
+        if self._value is not None:
+            _inherited.append(self._value)
+        self._value = None
+        self._pid = None
+
+
+def _reset_after_fork():
+    for instance in list(_instances):
+        instance._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,74 @@
+import os
+
+from process_local import ProcessLocal
+
+
+def public_object_url(base_url, bucket, path):
+    """Builds the public URL of a stored object; it depends only on bucket and path."""
+    return f"{base_url}/storage/v1/object/public/{bucket}/{path}"
+
+
+def create_supabase_client(url, key):
+    # Imported here: the supabase package takes a few hundred ms to import
+    from supabase import create_client
+    return create_client(url, key)
+
+
+class SupabaseStorage:
+    """Stores objects in Supabase Storage buckets.
+
+    The client is created on first use in each process, so the storage object can
+    be built before gunicorn forks its workers.
+    """
+
+    def __init__(self, url, key):
+        self.base_url = url
+        self._client = ProcessLocal(lambda: create_supabase_client(url, key))
+
+    @property
+    def client(self):
+        return self._client.get()
+
+    def connect(self):
+        """Creates this process's client ahead of the first upload."""
+        self._client.get()
+
+    def upload(self, bucket, path, data, content_type, upsert=False):
+        file_options = {"content-type": content_type}
+        if upsert:
+            file_options["upsert"] = "true"
+        self.client.storage.from_(bucket).upload(path, data, file_options)
+
+    def public_url(self, bucket, path):
+        return public_object_url(self.base_url, bucket, path)
+
+
+class LocalStorage:
+    """Stand-in for Supabase Storage that writes objects under a local directory."""
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url
+
+    def connect(self):
+        pass
+
+    def _object_file(self, bucket, path):
+        """Resolves an object to its file, rejecting keys that lead outside the bucket."""
+        bucket_dir = os.path.realpath(os.path.join(self.root, bucket))
+        full_path = os.path.realpath(os.path.join(bucket_dir, path))
+        if os.path.commonpath([bucket_dir, full_path]) != bucket_dir or full_path == bucket_dir:
+            raise ValueError(f"Invalid object path: {bucket}/{path}")
+        return full_path
+
+    def upload(self, bucket, path, data, content_type, upsert=False):
+        full_path = self._object_file(bucket, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if os.path.exists(full_path) and not upsert:
+            raise FileExistsError(f"Object already exists: {bucket}/{path}")
+        with open(full_path, "wb") as f:
+            f.write(data)
+
+    def public_url(self, bucket, path):
+        self._object_file(bucket, path)
+        return public_object_url(self.base_url, bucket, path)
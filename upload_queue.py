@@ -0,0 +1,149 @@
+import queue
+import random
+import threading
+import time
+import uuid
+
+from process_local import ProcessLocal
+
+
+class UploadQueueFull(Exception):
+    """Raised when an upload cannot be queued because the queue is at capacity."""
+
+
+class UploadQueue:
+    """Bounded queue of image uploads processed by a pool of background threads.
+
+    Failed uploads are retried with exponential backoff. When the last attempt
+    fails, or the job is still queued when the worker shuts down (see ``drain``),
+    the job's ``on_failure`` callback runs so the row pointing at the image can be
+    removed. Job status is kept in a cache backend (see cache.py) so it can be
+    shared across workers via Redis.
+    """
+
+    def __init__(self, storage, status_backend, workers, max_depth,
+                 max_attempts=5, backoff_base=0.5, status_ttl=3600):
+        self.storage = storage
+        self.status_backend = status_backend
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.status_ttl = status_ttl
+        self.max_depth = max_depth
+        # The queue and its threads are created on first use in each process, so the
+        # UploadQueue is safe to create before a fork
+        self._queue = ProcessLocal(self._start)
+
+    def _start(self):
+        jobs = queue.Queue(maxsize=self.max_depth)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(jobs,), name=f"upload-worker-{i}", daemon=True)
+            thread.start()
+        return jobs
+
+    def full(self):
+        jobs = self._queue.peek()
+        return jobs is not None and jobs.full()
+
+    def depth(self):
+        jobs = self._queue.peek()
+        return jobs.qsize() if jobs is not None else 0
+
+    def submit(self, bucket, path, data, content_type, timeout=1.0, on_failure=None, on_success=None):
+        """Queues an upload and returns its job id, waiting up to timeout for space.
+
+        ``on_failure()`` is called if the upload is finally given up, and
+        ``on_success()`` once it has been stored.
+        """
+        jobs = self._queue.get()
+        job_id = uuid.uuid4().hex
+        self._set_status(job_id, {"status": "queued", "attempts": 0, "bucket": bucket, "path": path})
+        try:
+            jobs.put((job_id, bucket, path, data, content_type, on_failure, on_success), timeout=timeout)
+        except queue.Full:
+            self.status_backend.delete(f"job:{job_id}")
+            raise UploadQueueFull("Upload queue is full")
+        return job_id
+
+    def drain(self, timeout):
+        """Waits up to timeout seconds for queued uploads to finish, for worker shutdown.
+
+        Jobs still queued after that are failed (running their ``on_failure``) rather
+        than dropped with the process. Returns the number of jobs failed.
+        """
+        jobs = self._queue.peek()
+        if jobs is None:
+            return 0
+        deadline = time.monotonic() + timeout
+        while jobs.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        abandoned = 0
+        while True:
+            try:
+                job_id, bucket, path, data, content_type, on_failure, on_success = jobs.get_nowait()
+            except queue.Empty:
+                return abandoned
+            try:
+                self._fail(job_id, bucket, path, 0, "Worker shut down before the upload ran", on_failure)
+            finally:
+                jobs.task_done()
+            abandoned += 1
+
+    def status(self, job_id):
+        return self.status_backend.get(f"job:{job_id}")
+
+    def _set_status(self, job_id, status):
+        self.status_backend.set(f"job:{job_id}", status, self.status_ttl)
+
+    def _run(self, jobs):
+        while True:
+            job_id, bucket, path, data, content_type, on_failure, on_success = jobs.get()
+            try:
+                self._process(job_id, bucket, path, data, content_type, on_failure, on_success)
+            finally:
+                jobs.task_done()
+
+    def _fail(self, job_id, bucket, path, attempts, error, on_failure):
+        if on_failure is not None:
+            try:
+                on_failure()
+            except Exception as e:
+                print(f"Upload failure callback failed for {bucket}/{path}: {e}")
+        self._set_status(job_id, {
+            "status": "failed",
+            "attempts": attempts,
+            "bucket": bucket,
+            "path": path,
+            "error": error
+        })
+
+    def _process(self, job_id, bucket, path, data, content_type, on_failure, on_success):
+        for attempt in range(1, self.max_attempts + 1):
+            self._set_status(job_id, {"status": "running", "attempts": attempt, "bucket": bucket, "path": path})
+            try:
+                # The caller reserved the row, so this is the only writer; overwriting covers
+                # an earlier attempt (or request) that stored the object but still failed
+                self.storage.upload(bucket, path, data, content_type, upsert=True)
+            except Exception as e:
+                print(f"Upload attempt {attempt} failed for {bucket}/{path}: {e}")
+                if attempt == self.max_attempts:
+                    self._fail(job_id, bucket, path, attempt, str(e), on_failure)
+                    return
+                delay = self.backoff_base * 2 ** (attempt - 1)
+                time.sleep(delay + random.uniform(0, delay))
+                continue
+
+            if on_success is not None:
+                try:
+                    on_success()
+                except Exception as e:
+                    print(f"Upload success callback failed for {bucket}/{path}: {e}")
+            self._set_status(job_id, {
+                "status": "succeeded",
+                "attempts": attempt,
+                "bucket": bucket,
+                "path": path,
+                "url": self.storage.public_url(bucket, path)
+            })
+            return